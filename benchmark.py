@@ -0,0 +1,237 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin
+
+=== Module Description ===
+
+This file contains a benchmark of the goal scorers and of goal._flatten.
+
+Each scorer is timed on seeded boards of each kind in BOARD_KINDS at each
+max_depth, and for each run the number of calls per second, the peak memory
+allocated during one call and the deepest Python call stack reached during
+one call are recorded. These are measured cold, with the board's cached hash
+and grid dropped before every call, so that each call does all of its work.
+The number of warm calls per second, with the caches kept, is recorded too.
+Run it from the command line to write the results as JSON:
+
+    python benchmark.py --output results.json
+"""
+from __future__ import annotations
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from block import Block, generate_boards
+from goal import BlobGoal, PerimeterGoal, _flatten
+from settings import COLOUR_LIST
+
+# The kinds of boards to benchmark on
+BOARD_KINDS = ['random', 'single_colour', 'checkerboard', 'fully_smashed']
+
+# The functions to benchmark, each called with a board
+SCORERS: Dict[str, Callable[[Block], Any]] = {
+    'PerimeterGoal.score': PerimeterGoal(COLOUR_LIST[0]).score,
+    'BlobGoal.score[leaves]': BlobGoal(COLOUR_LIST[0], 'leaves').score,
+    'BlobGoal.score[union_find]': BlobGoal(COLOUR_LIST[0],
+                                           'union_find').score,
+    'BlobGoal.score[recursive]': BlobGoal(COLOUR_LIST[0], 'recursive').score,
+    'BlobGoal.score[incremental]': BlobGoal(COLOUR_LIST[0],
+                                            'incremental').score,
+    'goal._flatten': _flatten
+}
+
+
+def make_board(kind: str, max_depth: int, seed: int) -> Block:
+    """Return a board of the given <kind> from BOARD_KINDS with <max_depth>,
+    the same for the same <seed>.
+
+    'random' boards come from generate_boards. 'single_colour' boards are one
+    leaf of COLOUR_LIST[0]. 'checkerboard' boards are smashed down to
+    <max_depth> everywhere with COLOUR_LIST[0] and COLOUR_LIST[1] cells
+    alternating, and 'fully_smashed' boards are smashed down to <max_depth>
+    everywhere with random colours.
+    """
+    if kind == 'random':
+        return generate_boards(max_depth, 750, 1, seed)[0]
+    if kind == 'single_colour':
+        return Block((0, 0), 750, COLOUR_LIST[0], 0, max_depth)
+
+    rng = random.Random(seed)
+    n = 2 ** max_depth
+
+    def colour_at(column: int, row: int) -> Tuple[int, int, int]:
+        """Return the colour of the unit cell at <column> and <row>."""
+        if kind == 'checkerboard':
+            return COLOUR_LIST[(column + row) % 2]
+        return rng.choice(COLOUR_LIST)
+
+    def build(block: Block, column: int, row: int) -> None:
+        """Smash <block>, whose upper-left unit cell is at <column> and <row>,
+        down to max_depth."""
+        if block.level == max_depth:
+            block.colour = colour_at(column, row)
+            return
+        size = round(block.size / 2.0)
+        half = n >> (block.level + 1)
+        x, y = block.position
+        children = []
+        for position, cell in [((x + size, y), (column + half, row)),
+                               ((x, y), (column, row)),
+                               ((x, y + size), (column, row + half)),
+                               ((x + size, y + size),
+                                (column + half, row + half))]:
+            child = Block(position, size, None, block.level + 1, max_depth)
+            build(child, *cell)
+            children.append(child)
+        block.children = children
+
+    board = Block((0, 0), 750, None, 0, max_depth)
+    build(board, 0, 0)
+    return board
+
+
+def _max_stack_depth(function: Callable[[Block], Any], board: Block) -> int:
+    """Return the deepest the Python call stack gets, relative to the caller,
+    while <function> is called with <board>.
+    """
+    depth = 0
+    deepest = 0
+
+    def profile(_frame: Any, event: str, _arg: Any) -> None:
+        """Follow calls and returns of Python functions."""
+        nonlocal depth, deepest
+        if event == 'call':
+            depth += 1
+            deepest = max(deepest, depth)
+        elif event == 'return':
+            depth -= 1
+
+    sys.setprofile(profile)
+    try:
+        function(board)
+    finally:
+        sys.setprofile(None)
+    return deepest
+
+
+def _calls_per_second(function: Callable[[Block], Any], board: Block,
+                      min_time: float, cold: bool) -> float:
+    """Return how many times per second <function> can be called with
+    <board>, timing calls for at least <min_time> seconds, and at least once.
+
+    If <cold> is True, the board's cached hash and grid are dropped before
+    each call, outside of the time measured.
+    """
+    calls = 0
+    elapsed = 0.0
+    while calls == 0 or elapsed < min_time:
+        if cold:
+            board.forget_caches()
+        start = time.perf_counter()
+        function(board)
+        elapsed += time.perf_counter() - start
+        calls += 1
+    return calls / elapsed
+
+
+def benchmark(function: Callable[[Block], Any], board: Block,
+              min_time: float) -> Dict[str, Any]:
+    """Return the results of calling <function> with <board> repeatedly for
+    at least <min_time> seconds, and at least once, both cold and warm.
+
+    The result has the number of cold and warm calls per second, and the peak
+    memory in bytes allocated during one cold call and the deepest call stack
+    reached during one cold call. If the call raises an exception, the result
+    has its name instead.
+    """
+    try:
+        cold = _calls_per_second(function, board, min_time, True)
+        warm = _calls_per_second(function, board, min_time, False)
+
+        board.forget_caches()
+        tracemalloc.start()
+        try:
+            function(board)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        board.forget_caches()
+        stack_depth = _max_stack_depth(function, board)
+    except (RecursionError, MemoryError) as error:
+        return {'error': type(error).__name__}
+    return {'ops_per_sec': cold, 'warm_ops_per_sec': warm,
+            'peak_memory_bytes': peak, 'max_recursion_depth': stack_depth}
+
+
+def run_benchmarks(depths: List[int], kinds: List[str], scorers: List[str],
+                   min_time: float, seed: int) -> List[Dict[str, Any]]:
+    """Return the results of benchmarking each of the <scorers> named in
+    SCORERS on a board of each of the <kinds> at each of the <depths>.
+    """
+    results = []
+    for max_depth in depths:
+        for kind in kinds:
+            board = make_board(kind, max_depth, seed)
+            for name in scorers:
+                result = {'function': name, 'board': kind,
+                          'max_depth': max_depth}
+                result.update(benchmark(SCORERS[name], board, min_time))
+                results.append(result)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the benchmarks as the command line arguments <argv> ask, and write
+    the results as JSON.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('===')[-1])
+    parser.add_argument('--min-depth', type=int, default=2)
+    parser.add_argument('--max-depth', type=int, default=8)
+    parser.add_argument('--kinds', nargs='+', default=BOARD_KINDS,
+                        choices=BOARD_KINDS)
+    parser.add_argument('--scorers', nargs='+', default=list(SCORERS),
+                        choices=list(SCORERS))
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='seconds to spend timing each case')
+    parser.add_argument('--seed', type=int, default=148)
+    parser.add_argument('--output', default='-',
+                        help="file to write the JSON to, or '-' for stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        'python': sys.version.split()[0],
+        'seed': args.seed,
+        'results': run_benchmarks(
+            list(range(args.min_depth, args.max_depth + 1)), args.kinds,
+            args.scorers, args.min_time, args.seed)
+    }
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -22,12 +22,28 @@ Misha Schwartz, and Jaisie Sin
 This file contains the Block class, the main data structure used in the game.
 """
 from __future__ import annotations
-from typing import Optional, Tuple, List
+from typing import Dict, Iterable, Iterator, Optional, Tuple, List
 import random
 import math
 
 from settings import colour_name, COLOUR_LIST
 
+# Every colour a Block has ever been given, in the order first seen. A Block
+# stores the index of its colour in this list rather than the colour tuple
+# itself. The colours in COLOUR_LIST always occupy the first indices, in order.
+_PALETTE: List[Tuple[int, int, int]] = list(COLOUR_LIST)
+_PALETTE_INDEX: Dict[Tuple[int, int, int], int] = {
+    colour: i for i, colour in enumerate(_PALETTE)
+}
+
+_MASK_64 = (1 << 64) - 1
+
+# the most changes a board remembers in its change log
+_MAX_CHANGES = 4096
+
+# the metadata of Blocks that are not the root of a board, by max_depth
+_LOOSE_INFO: Dict[int, _BoardInfo] = {}
+
 
 def generate_board(max_depth: int, size: int) -> Block:
     """Return a new game board with a depth of <max_depth> and dimensions of
@@ -47,6 +63,241 @@ def generate_board(max_depth: int, size: int) -> Block:
     return board
 
 
+def generate_boards(max_depth: int, size: int, count: int,
+                    seed: int) -> List[Block]:
+    """Return <count> new game boards with a depth of <max_depth> and
+    dimensions of <size> by <size>, generated like generate_board.
+
+    Board i is generated from its own random stream, seeded by <seed> and i,
+    so the boards do not depend on the global random state, on each other or
+    on <count>: any board can be regenerated on its own, in any process.
+
+    >>> boards = generate_boards(3, 750, 5, 148)
+    >>> len(boards)
+    5
+    >>> boards[4] == generate_boards(3, 750, 10, 148)[4]
+    True
+    """
+    boards = []
+    for i in range(count):
+        rng = random.Random(f'{seed}:{i}')
+        board = _new_block((0, 0), size, rng.randrange(len(COLOUR_LIST)), 0,
+                           _BoardInfo(max_depth))
+        board._smash(rng)
+        boards.append(board)
+    return boards
+
+
+def palette_index(colour: Optional[Tuple[int, int, int]]) -> Optional[int]:
+    """Return the index of <colour> in the palette, adding it to the palette
+    if it has not been seen before.
+
+    Return None if <colour> is None.
+
+    >>> palette_index(COLOUR_LIST[2])
+    2
+    >>> palette_index(None) is None
+    True
+    """
+    if colour is None:
+        return None
+    index = _PALETTE_INDEX.get(colour)
+    if index is None:
+        index = len(_PALETTE)
+        _PALETTE.append(colour)
+        _PALETTE_INDEX[colour] = index
+    return index
+
+
+def palette_colour(index: int) -> Tuple[int, int, int]:
+    """Return the colour whose index in the palette is <index>.
+
+    Precondition: <index> was returned by palette_index.
+
+    >>> palette_colour(palette_index(COLOUR_LIST[3])) == COLOUR_LIST[3]
+    True
+    """
+    return _PALETTE[index]
+
+
+def palette() -> List[Tuple[int, int, int]]:
+    """Return a list of every colour in the palette, where the colour at
+    index i is the colour whose palette index is i.
+    """
+    return _PALETTE[:]
+
+
+def _zobrist_key(x: int, y: int, level: int, colour_index: int) -> int:
+    """Return the 64-bit key of a leaf at <level> of the colour with palette
+    index <colour_index>, whose upper-left unit cell is at column <x> and row
+    <y>.
+
+    The keys are the splitmix64 mix of the packed arguments, so they are the
+    same in every process.
+    """
+    z = ((x << 40 | y << 16 | level << 8 | colour_index) +
+         0x9E3779B97F4A7C15) & _MASK_64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK_64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK_64
+    return z ^ (z >> 31)
+
+
+class _BoardInfo:
+    """Metadata shared by all the Blocks that make up one board.
+
+    === Attributes ===
+    max_depth:
+        The deepest level allowed in the board.
+    root:
+        The root of the board, if the board keeps its hash (and grid, if any)
+        up to date as it changes. Otherwise None.
+    hash:
+        The Zobrist hash of the board: the XOR of the key of every leaf. Only
+        meaningful if <root> is not None.
+    grid:
+        The colour of every unit cell of the board, as a list of columns, or
+        None if it has not been asked for since <root> was last set.
+    version:
+        The number of changes made to the board, counting each time it was
+        changed in a way that cannot be followed as one change.
+    changes:
+        The square of unit cells changed by each of the most recent changes
+        to the board, as (column, row, span), oldest first. The last change
+        in the list is change number <version>.
+    """
+    __slots__ = ('max_depth', 'root', 'hash', 'grid', 'version', 'changes')
+    max_depth: int
+    root: Optional[Block]
+    hash: int
+    grid: Optional[List[List[Tuple[int, int, int]]]]
+    version: int
+    changes: List[Tuple[int, int, int]]
+
+    def __init__(self, max_depth: int) -> None:
+        """Initialize the metadata for a board with the given <max_depth>.
+        """
+        self.max_depth = max_depth
+        self.root = None
+        self.hash = 0
+        self.grid = None
+        self.version = 0
+        self.changes = []
+
+    def changes_since(self, version: int) \
+            -> Optional[List[Tuple[int, int, int]]]:
+        """Return the squares changed since the board's version was <version>,
+        oldest first, or None if they are not all remembered.
+        """
+        first = self.version - len(self.changes)
+        if version < first:
+            return None
+        return self.changes[version - first:]
+
+    def track(self, root: Block) -> None:
+        """Start keeping the hash of the board rooted at <root> up to date.
+
+        Every Block of the board that is not shared with another board is
+        made to use this metadata, in case the board was put together by
+        hand.
+        """
+        stack = [root]
+        while stack:
+            block = stack.pop()
+            block._info = self
+            if not block._shares_children:
+                stack.extend(block._children)
+        self.root = root
+        self.hash = root._region_hash(0, 0)
+        self.grid = None
+        self.version += 1
+        self.changes = []
+
+    def forget(self) -> None:
+        """Stop keeping the hash and grid up to date, because the board was
+        changed in a way that cannot be followed.
+        """
+        self.root = None
+        self.hash = 0
+        self.grid = None
+        self.version += 1
+        self.changes = []
+
+    def cell_grid(self) -> List[List[Tuple[int, int, int]]]:
+        """Return the grid of the board, drawing it if there is none yet.
+
+        Precondition: <root> is not None.
+        """
+        if self.grid is None:
+            n = 1 << self.max_depth
+            self.grid = [[None] * n for _ in range(n)]
+            self.root.draw_cells(self.grid, 0, 0)
+        return self.grid
+
+    def changing(self, block: Block) -> int:
+        """Return what changed needs to know about <block> before it changes.
+        """
+        if self.root is None:
+            return 0
+        return block._region_hash(*self.cell_of(block))
+
+    def changed(self, block: Block, old: int) -> None:
+        """Update the hash, and redraw the cells of <block> in the grid, after
+        <block> changed. <old> is what changing returned before the change.
+        """
+        if self.root is not None:
+            x, y = self.cell_of(block)
+            self.hash ^= old ^ block._region_hash(x, y)
+            self.version += 1
+            self.changes.append((x, y,
+                                 1 << (self.max_depth - block.level)))
+            if len(self.changes) > _MAX_CHANGES:
+                del self.changes[:_MAX_CHANGES // 2]
+            if self.grid is not None:
+                block.draw_cells(self.grid, x, y)
+
+    def cell_of(self, block: Block) -> Tuple[int, int]:
+        """Return the column and row of the upper-left unit cell of <block>.
+
+        Precondition: <block> was reached from <root> since the board last
+        changed.
+        """
+        return self.root.cell_of(block)
+
+
+def _loose_info(max_depth: int) -> _BoardInfo:
+    """Return the metadata shared by every Block with <max_depth> that was
+    made by Block.__init__ below level 0 and has not joined a board yet.
+
+    It never keeps a hash or grid, so sharing it costs nothing. Blocks are
+    given their board's own metadata when the board starts keeping its hash.
+    """
+    if max_depth not in _LOOSE_INFO:
+        _LOOSE_INFO[max_depth] = _BoardInfo(max_depth)
+    return _LOOSE_INFO[max_depth]
+
+
+def _new_block(position: Tuple[int, int], size: int,
+               colour_index: Optional[int], level: int,
+               info: _BoardInfo) -> Block:
+    """Return a new childless Block that shares <info> with the rest of its
+    board.
+
+    This skips Block.__init__, so <colour_index> must already be a palette
+    index (or None).
+    """
+    block = Block.__new__(Block)
+    block.position = position
+    block.size = size
+    block._colour = colour_index
+    block.level = level
+    block._info = info
+    block._children = []
+    block._shares_children = False
+    block._stale = False
+    block._turns = 0
+    return block
+
+
 class Block:
     """A square Block in the Blocky game, represented as a tree.
 
@@ -79,6 +330,11 @@ class Block:
         stored in this order: upper-right child, upper-left child,
         lower-left child, lower-right child.
 
+    Rotations and positions are brought up to date lazily, as <children> is
+    read, so the position of a Block is only guaranteed to be correct when it
+    was reached from the root of its board through <children> since the last
+    change to one of its ancestors.
+
     === Representation Invariants===
     - len(children) == 0 or len(children) == 4
     - If this Block has children:
@@ -92,12 +348,41 @@ class Block:
         - its colour is not None.
     - level <= max_depth
     """
+    # === Private Attributes ===
+    # _colour:
+    #     The index of <colour> in the palette, or None if <colour> is None.
+    # _info:
+    #     The metadata shared by every Block on this Block's board, including
+    #     <max_depth>.
+    # _children:
+    #     The children of this Block, whose positions may be out of date.
+    # _shares_children:
+    #     True iff <children> holds Blocks that also belong to another board
+    #     made by path_copy. They are replaced by copies of their own before
+    #     anything below this Block is changed.
+    # _stale:
+    #     True iff the descendants of this Block have not been updated since
+    #     this Block's children were moved or rotated. The children are
+    #     updated the next time <children> is read, and become stale in turn,
+    #     so a move only costs O(1) updates.
+    # _turns:
+    #     The number of clockwise quarter turns that <_children>, and every
+    #     Block below them, must still be rotated by. rotate only adds to it.
+    #
+    # == Representation Invariants concerning the private attributes ==
+    #     0 <= _turns < 4
+    #     _turns == 0 or _stale
+    __slots__ = ('position', 'size', '_colour', 'level', '_info', '_children',
+                 '_shares_children', '_stale', '_turns')
     position: Tuple[int, int]
     size: int
-    colour: Optional[Tuple[int, int, int]]
     level: int
-    max_depth: int
-    children: List[Block]
+    _colour: Optional[int]
+    _info: _BoardInfo
+    _children: List[Block]
+    _shares_children: bool
+    _stale: bool
+    _turns: int
 
     def __init__(self, position: Tuple[int, int], size: int,
                  colour: Optional[Tuple[int, int, int]], level: int,
@@ -113,10 +398,238 @@ class Block:
         """
         self.position = position
         self.size = size
-        self.colour = colour
+        self._colour = palette_index(colour)
         self.level = level
-        self.max_depth = max_depth
-        self.children = []
+        # only the root of a board needs metadata of its own
+        if level == 0:
+            self._info = _BoardInfo(max_depth)
+        else:
+            self._info = _loose_info(max_depth)
+        self._children = []
+        self._shares_children = False
+        self._stale = False
+        self._turns = 0
+
+    @classmethod
+    def from_leaves(cls, size: int, max_depth: int,
+                    leaves: Iterable[Tuple[int, int]]) -> Block:
+        """Return a new board with dimensions <size> by <size> and a depth of
+        <max_depth>, whose leaves are <leaves>.
+
+        <leaves> gives the level and the palette index of the colour of each
+        leaf, in Z-order: the leaves of the upper-left child come first, then
+        those of the upper-right, lower-left and lower-right children.
+
+        Precondition: <leaves> covers the whole board exactly once.
+        """
+        info = _BoardInfo(max_depth)
+        root = _new_block((0, 0), size, None, 0, info)
+        # each stack entry is a block whose leaves start at the next leaf
+        stack = [root]
+        leaves = iter(leaves)
+        level, colour_index = next(leaves)
+        while stack:
+            block = stack.pop()
+            if level == block.level:
+                block._colour = colour_index
+                level, colour_index = next(leaves, (None, None))
+            else:
+                child_size = block._child_size()
+                block._children = [
+                    _new_block(position, child_size, None, block.level + 1,
+                               info)
+                    for position in block._children_positions()]
+                # upper-left, upper-right, lower-left, lower-right is Z-order
+                stack.extend([block._children[3], block._children[2],
+                              block._children[0], block._children[1]])
+        return root
+
+    @property
+    def colour(self) -> Optional[Tuple[int, int, int]]:
+        """The colour of this Block if it is not subdivided, otherwise None.
+        """
+        if self._colour is None:
+            return None
+        return _PALETTE[self._colour]
+
+    @colour.setter
+    def colour(self, colour: Optional[Tuple[int, int, int]]) -> None:
+        self._colour = palette_index(colour)
+        # this block may not have been reached from the root, so the hash is
+        # recomputed the next time it is needed
+        self._info.forget()
+
+    @property
+    def max_depth(self) -> int:
+        """The deepest level allowed in the overall block structure.
+        """
+        return self._info.max_depth
+
+    @property
+    def children(self) -> List[Block]:
+        """The blocks into which this block is subdivided, with up to date
+        positions and orientation.
+        """
+        if self._stale:
+            self._update_children()
+        return self._children
+
+    @children.setter
+    def children(self, children: List[Block]) -> None:
+        self._set_children(children)
+        # the new children may come from anywhere, so the hash is recomputed
+        # the next time it is needed
+        self._info.forget()
+
+    def _set_children(self, children: List[Block]) -> None:
+        """Replace this Block's children with <children>, which belong only to
+        this Block's board and have up to date positions.
+        """
+        self._children = children
+        self._shares_children = False
+        self._stale = False
+        self._turns = 0
+
+    def board_hash(self) -> int:
+        """Return a 64-bit Zobrist hash of this board.
+
+        The hash is the XOR of a key for every leaf, chosen by the leaf's
+        region of unit cells, its level and its colour. Equal boards have
+        equal hashes, and different boards have different hashes with very
+        high probability.
+
+        The first call computes the hash in O(number of leaves) time. From
+        then on, every move updates it by removing the keys of the leaves it
+        replaces and adding the keys of the new ones, so later calls take
+        O(1) time.
+
+        Precondition: this Block is at level 0.
+        """
+        if self._info.root is not self:
+            self._info.track(self)
+        return self._info.hash
+
+    def cell_grid(self) -> List[List[Tuple[int, int, int]]]:
+        """Return the colour of every unit cell of this board, as a list L of
+        columns where L[i][j] is the colour of the unit cell at column i and
+        row j.
+
+        The grid is drawn on the first call. From then on, every move redraws
+        only the cells of the Block it changes, so later calls take O(1)
+        time. The grid belongs to this board and must not be changed.
+
+        Precondition: this Block is at level 0.
+        """
+        if self._info.root is not self:
+            self._info.track(self)
+        return self._info.cell_grid()
+
+    def keeps_hash(self) -> bool:
+        """Return True iff this board keeps its Zobrist hash up to date as it
+        changes, because board_hash or cell_grid was called on it.
+        """
+        return self._info.root is self
+
+    def change_mark(self) -> Tuple[object, int]:
+        """Return a mark of the current state of this board, to pass to
+        changes_since later.
+        """
+        return self._info, self._info.version
+
+    def changes_since(self, mark: Tuple[object, int]) \
+            -> Optional[List[Tuple[int, int, int]]]:
+        """Return the squares of unit cells changed on this board since
+        change_mark returned <mark>, as (column, row, span), oldest first.
+
+        Return None if they are not all known, because the board does not
+        keep its hash, was changed in a way that cannot be followed, or has
+        changed too many times since.
+        """
+        info, version = mark
+        if info is not self._info or info.root is not self:
+            return None
+        return info.changes_since(version)
+
+    def forget_caches(self) -> None:
+        """Stop keeping the hash and grid of this board up to date, so that
+        they are worked out from scratch the next time they are asked for.
+        """
+        self._info.forget()
+
+    def draw_cells(self, grid: List[List[Optional[Tuple[int, int, int]]]],
+                   x: int, y: int) -> None:
+        """Set the colour of each unit cell of this Block in <grid>, a list of
+        columns, given that this Block's upper-left unit cell is at column <x>
+        and row <y>.
+        """
+        max_depth = self._info.max_depth
+        for left, top, level, colour_index in self.leaves(x, y):
+            span = 1 << (max_depth - level)
+            cells = [_PALETTE[colour_index]] * span
+            for column in grid[left:left + span]:
+                column[top:top + span] = cells
+
+    def leaves(self, x: int, y: int) -> Iterator[Tuple[int, int, int, int]]:
+        """Yield the column and row of the upper-left unit cell, the level and
+        the palette index of the colour of each leaf of this Block, given that
+        this Block's upper-left unit cell is at column <x> and row <y>.
+
+        Pending rotations are taken into account without being applied, so
+        nothing is changed.
+        """
+        max_depth = self._info.max_depth
+        stack = [(self, x, y, 0)]
+        while stack:
+            block, x, y, turns = stack.pop()
+            children = block._children
+            if children:
+                turns = (turns + block._turns) % 4
+                half = 1 << (max_depth - block.level - 1)
+                # once rotated, child i + turns is at index i
+                stack.append((children[turns], x + half, y, turns))
+                stack.append((children[(turns + 1) % 4], x, y, turns))
+                stack.append((children[(turns + 2) % 4], x, y + half, turns))
+                stack.append((children[(turns + 3) % 4], x + half, y + half,
+                              turns))
+            else:
+                yield x, y, block.level, block._colour
+
+    def border_leaves(self) -> Iterator[Tuple[int, int, int, int]]:
+        """Yield the leaves of this Block that touch its outer edge, as
+        leaves would yield them given that this Block's upper-left unit cell is at
+        column 0 and row 0.
+
+        Children that do not touch the edge are never visited, so only
+        O(2^(max_depth - level)) Blocks are visited rather than all of them.
+        """
+        max_depth = self._info.max_depth
+        side = 1 << (max_depth - self.level)
+        stack = [(self, 0, 0, 0)]
+        while stack:
+            block, x, y, turns = stack.pop()
+            children = block._children
+            if children:
+                turns = (turns + block._turns) % 4
+                half = 1 << (max_depth - block.level - 1)
+                for i, (cx, cy) in enumerate([(x + half, y), (x, y),
+                                              (x, y + half),
+                                              (x + half, y + half)]):
+                    if cx == 0 or cy == 0 or cx + half == side or \
+                            cy + half == side:
+                        stack.append((children[(turns + i) % 4], cx, cy,
+                                      turns))
+            else:
+                yield x, y, block.level, block._colour
+
+    def _region_hash(self, x: int, y: int) -> int:
+        """Return the XOR of the Zobrist keys of the leaves of this Block,
+        given that this Block's upper-left unit cell is at column <x> and row
+        <y>.
+        """
+        result = 0
+        for leaf in self.leaves(x, y):
+            result ^= _zobrist_key(*leaf)
+        return result
 
     def __str__(self) -> str:
         """Return this Block in a string format.
@@ -144,23 +657,34 @@ class Block:
         """Return True iff this Block and all its descendents are equivalent to
         the <other> Block and all its descendents.
         """
-        if len(self.children) == 0 and len(other.children) == 0:
+        if self._info.root is self and other._info.root is other and \
+                self._info.hash != other._info.hash:
+            # both are boards that keep their hash up to date
+            return False
+        return self._same_tree(other)
+
+    def _same_tree(self, other: Block) -> bool:
+        """Return True iff this Block and all its descendents are equivalent to
+        the <other> Block and all its descendents, without checking hashes.
+        """
+        # the children are brought up to date once, then compared
+        children = self.children
+        other_children = other.children
+        if not children and not other_children:
             # Both self and other are leaves.
             return self.position == other.position and \
-                   self.size == other.size and \
-                   self.colour == other.colour and \
-                   self.level == other.level and \
-                   self.max_depth == other.max_depth
-        elif len(self.children) != len(other.children):
+                self.size == other.size and \
+                self._colour == other._colour and \
+                self.level == other.level and \
+                self._info.max_depth == other._info.max_depth
+        elif len(children) != len(other_children):
             # One of self or other is a leaf while the other is not.
             return False
         else:
             # Both self and other have four children.
-            for i in range(4):
-                # The != operator also uses the __eq__ special method.
-                if self.children[i] != other.children[i]:
+            for child, other_child in zip(children, other_children):
+                if not child._same_tree(other_child):
                     return False
-
             return True
 
     def _child_size(self) -> int:
@@ -180,30 +704,31 @@ class Block:
 
         return [(x + size, y), (x, y), (x, y + size), (x + size, y + size)]
 
-    def _update_children_positions(self, position: Tuple[int, int]) -> None:
-        """Set the position of this Block to <position> and update all its
-        descendants to have positions consistent with this Block's.
+    def _update_children(self) -> None:
+        """Apply this Block's pending rotation to its children and update their
+        positions to be consistent with this Block's position.
 
-        <position> is the (x, y) coordinates of the upper-left corner of this
-        Block.
+        The pending rotation is passed on to the children's own children,
+        which are marked as out of date.
         """
-        self.position = position
-
-        # if this block has any descendants (self.children is not empty)
-        # their positions are all updated recursively
-        if self.children:
-            # this is similar to _children_positions
-            x = position[0]
-            y = position[1]
-            size = self._child_size()
-            # upper right
-            self.children[0]._update_children_positions((x + size, y))
-            # upper left
-            self.children[1]._update_children_positions((x, y))
-            # lower left
-            self.children[2]._update_children_positions((x, y + size))
-            # lower right
-            self.children[3]._update_children_positions((x + size, y + size))
+        self._unshare()
+        children = self._children
+        turns = self._turns
+        if turns:
+            # one clockwise turn moves child i + 1 to index i
+            children[:] = [children[(i + turns) % 4] for i in range(4)]
+            for child in children:
+                if child._children:
+                    child._turns = (child._turns + turns) % 4
+                    child._stale = True
+            self._turns = 0
+        for child, position in zip(children, self._children_positions()):
+            if child.position != position:
+                child.position = position
+                # the grandchildren are updated when they are next read
+                if child._children:
+                    child._stale = True
+        self._stale = False
 
     def smashable(self) -> bool:
         """Return True iff this block can be smashed.
@@ -211,7 +736,25 @@ class Block:
         A block can be smashed if it has no children and its level is not at
         max_depth.
         """
-        return self.level != self.max_depth and len(self.children) == 0
+        return self.level != self._info.max_depth and not self._children
+
+    def paintable(self, colour: Tuple[int, int, int]) -> bool:
+        """Return True iff this block can be painted with <colour>.
+
+        A block can be painted if it is a leaf at a level of max_depth and its
+        colour is different from <colour>.
+        """
+        return not self._children and self.level == self._info.max_depth \
+            and self.colour != colour
+
+    def combinable(self) -> bool:
+        """Return True iff this block can be combined.
+
+        A block can be combined if it is at a level of max_depth - 1, it has
+        children, and its children have a majority colour.
+        """
+        return self.level == self._info.max_depth - 1 and \
+            bool(self._children) and self._majority_colour() is not None
 
     def smash(self) -> bool:
         """Sub-divide this block so that it has four randomly generated
@@ -222,53 +765,39 @@ class Block:
 
         Return True iff the smash was performed.
         """
+        old = self._info.changing(self)
+        if self._smash():
+            self._info.changed(self, old)
+            return True
+        return False
+
+    def _smash(self, rng: random.Random = random) -> bool:
+        """Smash this Block like smash, without updating the board's hash,
+        drawing the random choices from <rng>.
+        """
         if self.smashable():
 
             # generating children blocks
-            # with a random colour from COLOUR_LIST
-            upper_right_child = Block(
-                (self._children_positions()[0]),  # position
-                self._child_size(),  # size
-                random.choice(COLOUR_LIST),  # random colour
-                self.level + 1,  # level
-                self.max_depth)  # max_depth
-            upper_left_child = Block(
-                (self._children_positions()[1]),  # position
-                self._child_size(),  # size
-                random.choice(COLOUR_LIST),  # random colour
-                self.level + 1,  # level
-                self.max_depth)  # max_depth
-            lower_left_child = Block(
-                (self._children_positions()[2]),  # position
-                self._child_size(),  # size
-                random.choice(COLOUR_LIST),  # random colour
-                # random colour
-                self.level + 1,  # level
-                self.max_depth)  # max_depth
-            lower_right_child = Block(
-                (self._children_positions()[3]),  # position
-                self._child_size(),  # size
-                random.choice(COLOUR_LIST),  # random colour
-                # random colour
-                self.level + 1,  # level
-                self.max_depth)  # max_depth
+            # with a random colour from COLOUR_LIST, whose colours occupy
+            # the first indices of the palette
+            size = self._child_size()
+            level = self.level + 1
+            children = [_new_block(position, size,
+                                   rng.randrange(len(COLOUR_LIST)),
+                                   level, self._info)
+                        for position in self._children_positions()]
 
             # generating a random number in the interval [0,1)
             # IF the random number is less than math.exp(-0.25 * level)
             # THEN the children are smashed recursively
-            if random.random() <= math.exp(-0.25 * self.level):
+            if rng.random() <= math.exp(-0.25 * self.level):
                 # smashing the children
-                upper_right_child.smash()
-                upper_left_child.smash()
-                lower_left_child.smash()
-                lower_right_child.smash()
+                for child in children:
+                    child._smash(rng)
 
             # changing this block to be parent
-            self.colour = None
-            self.children = [upper_right_child,
-                             upper_left_child,
-                             lower_left_child,
-                             lower_right_child]
+            self._colour = None
+            self._set_children(children)
             return True
         else:
             # block cannot be smashed
@@ -284,40 +813,33 @@ class Block:
 
         Precondition: <direction> is either 0 or 1
         """
-        if self.children:
+        if self._turns:
+            # the children must be in their rotated order before swapping
+            self._update_children()
+        children = self._children
+        if children:
             # block has children
-
-            # positions of the children
-            upper_right_pos = self.children[0].position
-            upper_left_pos = self.children[1].position
-            lower_left_pos = self.children[2].position
-            lower_right_pos = self.children[3].position
+            old = self._info.changing(self)
 
             if direction == 1:
                 # swap vertically
 
                 # swapping left blocks
-                self.children[1], self.children[2] = \
-                    self.children[2], self.children[1]
+                children[1], children[2] = children[2], children[1]
                 # swapping right blocks
-                self.children[0], self.children[3] = \
-                    self.children[3], self.children[0]
+                children[0], children[3] = children[3], children[0]
 
             else:
                 # direction == 0, swap horizontally
 
                 # swapping upper blocks
-                self.children[1], self.children[0] = \
-                    self.children[0], self.children[1]
+                children[1], children[0] = children[0], children[1]
                 # swapping right blocks
-                self.children[2], self.children[3] = \
-                    self.children[3], self.children[2]
-
-            # updating positions of children
-            self.children[0]._update_children_positions(upper_right_pos)
-            self.children[1]._update_children_positions(upper_left_pos)
-            self.children[2]._update_children_positions(lower_left_pos)
-            self.children[3]._update_children_positions(lower_right_pos)
+                children[2], children[3] = children[3], children[2]
+
+            # the positions of the children are updated when next read
+            self._stale = True
+            self._info.changed(self, old)
             return True
         else:
             # block has no children
@@ -333,55 +855,14 @@ class Block:
 
         Precondition: <direction> is either 1 or 3.
         """
-        if self.children:
+        if self._children:
             # block has children
-
-            # positions of the children
-            upper_right_pos = self.children[0].position
-            upper_left_pos = self.children[1].position
-            lower_left_pos = self.children[2].position
-            lower_right_pos = self.children[3].position
-
-            if direction == 1:
-                # if child has children, rotate it's children
-                if self.children[0].children:
-                    self.children[0].rotate(1)
-                if self.children[1].children:
-                    self.children[1].rotate(1)
-                if self.children[2].children:
-                    self.children[2].rotate(1)
-                if self.children[3].children:
-                    self.children[3].rotate(1)
-
-                # rotate clockwise
-                self.children[1], self.children[0], \
-                self.children[2], self.children[3] = \
-                self.children[2], self.children[1], \
-                self.children[3], self.children[0]
-
-            else:
-                # direction == 3, rotate counter-clockwise
-
-                # if child has children, rotate it's children
-                if self.children[0].children:
-                    self.children[0].rotate(3)
-                if self.children[1].children:
-                    self.children[1].rotate(3)
-                if self.children[2].children:
-                    self.children[2].rotate(3)
-                if self.children[3].children:
-                    self.children[3].rotate(3)
-
-                self.children[1], self.children[0], \
-                self.children[2], self.children[3] = \
-                self.children[0], self.children[3], \
-                self.children[1], self.children[2]
-
-            # updating positions of children
-            self.children[0]._update_children_positions(upper_right_pos)
-            self.children[1]._update_children_positions(upper_left_pos)
-            self.children[2]._update_children_positions(lower_left_pos)
-            self.children[3]._update_children_positions(lower_right_pos)
+            # the children, and everything below them, are rotated when they
+            # are next read
+            old = self._info.changing(self)
+            self._turns = (self._turns + direction) % 4
+            self._stale = True
+            self._info.changed(self, old)
             return True
         else:
             # block has no children
@@ -393,10 +874,11 @@ class Block:
 
         Return True iff this Block's colour was changed.
         """
-        if not self.children and self.level == self.max_depth and self.colour \
-                != colour:
+        if self.paintable(colour):
             # this block is a leaf (no children)
-            self.colour = colour
+            old = self._info.changing(self)
+            self._colour = palette_index(colour)
+            self._info.changed(self, old)
             return True
         else:
             # block has children, not a leaf
@@ -415,85 +897,299 @@ class Block:
 
         Return True iff this Block was turned into a leaf node.
         """
-        if self.level != self.max_depth - 1 or not self.children:
+        if self.level != self.max_depth - 1 or not self._children:
             # block is not at a level of max_depth - 1,
             # or this block has no children
             return False
 
         # now we know that block is at level of max_depth - 1 and has children
-
-        # dict with colour keys and number of occurrences as the item
-        colours = {}
-        # counting colours
-        for child in self.children:
-            if child.colour in colours:
-                colours[child.colour] += 1
-            else:
-                colours[child.colour] = 1
-
-        # only for pyTA, need to make sure variable is defined
-        # if it stays 1 it would result in a error somewhere
-        max_colour = 1
-
-        # there are 4 children so 4 potential lengths for colours
-        # 1, 2, 3, 4
-        if len(colours) == 1:
-            # all children are the same colour
-            max_colour = self.children[0].colour
-        elif len(colours) == 2:
-            # 2 options 2,2 and 1,3 blocks
-
-            # there is a tie when there are 2 blocks of each colour
-            # majority colour would have 3 blocks
-            for colour in colours:
-                if colours[colour] == 2:
-                    return False
-                elif colours[colour] == 3:
-                    max_colour = colour
-        elif len(colours) == 3:
-            # majority colour would have 2 blocks
-            # no way for a tie with three colours and 4 blocks
-            for colour in colours:
-                if colours[colour] == 2:
-                    max_colour = colour
-        else:
-            # if len(colours) = 4 there is a tie (4 different colours)
+        max_colour = self._majority_colour()
+        if max_colour is None:
+            # there is a tie
             return False
 
         # changing block to be max_colour and removing children
-        self.colour = max_colour
-        self.children = []
+        old = self._info.changing(self)
+        self._colour = palette_index(max_colour)
+        self._set_children([])
+        self._info.changed(self, old)
         return True
 
+    def _majority_colour(self) -> Optional[Tuple[int, int, int]]:
+        """Return the colour of the most children of this Block, or None if
+        there is a tie.
+
+        Precondition: this Block has children, which are all leaves.
+        """
+        # dict with colour keys and number of occurrences as the item
+        colours = {}
+        for child in self._children:
+            colours[child.colour] = colours.get(child.colour, 0) + 1
+        counts = sorted(colours.values())
+        if len(counts) > 1 and counts[-1] == counts[-2]:
+            # a tie does not constitute a majority
+            return None
+        return max(colours, key=colours.get)
+
+    def cell_of(self, block: Block) -> Tuple[int, int]:
+        """Return the column and row of the upper-left unit cell of <block>,
+        where this Block's upper-left unit cell is at column 0 and row 0.
+
+        Precondition: <block> is this Block or one of its descendants, and was
+        reached from this Block since this Block last changed.
+        """
+        x = 0
+        y = 0
+        node = self
+        while node is not block:
+            i = node._child_index(block.position)
+            half = 1 << (self._info.max_depth - node.level - 1)
+            if i in (0, 3):
+                x += half
+            if i in (2, 3):
+                y += half
+            node = node._children[i]
+        return x, y
+
+    def moved_leaves(self, action: str, direction: Optional[int],
+                     colour: Tuple[int, int, int], x: int,
+                     y: int) -> Optional[List[Tuple[int, int, int, int]]]:
+        """Return the leaves this Block would have after the move <action> in
+        <direction>, painting with <colour>, as leaves(x, y) would yield
+        them. Nothing is changed.
+
+        Return None if the move would not be performed, or if it is a smash,
+        whose result is random.
+        """
+        max_depth = self._info.max_depth
+        side = 1 << (max_depth - self.level)
+        if action in ('rotate', 'swap'):
+            if not self._children:
+                return None
+            leaves = []
+            half = side // 2
+            for left, top, level, colour_index in self.leaves(0, 0):
+                span = 1 << (max_depth - level)
+                if action == 'swap' and direction == 0:
+                    left = (left + half) % side
+                elif action == 'swap':
+                    top = (top + half) % side
+                elif direction == 1:
+                    # clockwise, so the top edge becomes the right edge
+                    left, top = side - span - top, left
+                else:
+                    left, top = top, side - span - left
+                leaves.append((x + left, y + top, level, colour_index))
+            return leaves
+        if action == 'paint':
+            if not self.paintable(colour):
+                return None
+            return [(x, y, self.level, palette_index(colour))]
+        if action == 'combine':
+            if not self.combinable():
+                return None
+            return [(x, y, self.level,
+                     palette_index(self._majority_colour()))]
+        return None
+
     def create_copy(self) -> Block:
         """Return a new Block that is a deep copy of this Block.
 
         Remember that a deep copy has new blocks (not aliases) at every level.
         """
+        return self._copy(_BoardInfo(self._info.max_depth))
+
+    def _copy(self, info: _BoardInfo) -> Block:
+        """Return a deep copy of this Block whose blocks all share <info>.
+        """
+        # position and colour are immutable so there is no aliasing
+        copy = _new_block(self.position, self.size, self._colour, self.level,
+                          info)
+        if self._children:
+            # block has children, which may be out of date in the copy
+            # exactly as they are in this Block
+            copy._children = [child._copy(info) for child in self._children]
+            copy._stale = self._stale
+            copy._turns = self._turns
+        return copy
+
+    def path_copy(self, block: Block) -> Tuple[Block, Block]:
+        """Return a copy of this Block together with the copy of <block> in it.
+
+        Only the Blocks on the path from this Block down to <block> are
+        copied. Every other Block is shared with this Block's tree, and is
+        copied only once a change to the copy of <block> reaches it, so
+        trying a move on the copy of <block> costs O(depth) new Blocks
+        rather than a copy of the whole board. The copy does not keep its
+        hash or grid up to date until board_hash or cell_grid is called on it,
+        so moves on it stay this cheap.
+
+        The copy must only be changed through the returned copy of <block>
+        (or the Blocks returned by later calls to path_copy on the copy). It
+        is no longer valid once this Block's tree is changed.
+
+        Precondition: <block> is this Block or one of its descendants.
+        """
+        info = _BoardInfo(self._info.max_depth)
+        copy = self._clone(info)
+        node = self
+        node_copy = copy
+        while node is not block:
+            i = node._child_index(block.position)
+            node = node._children[i]
+            node_copy._children[i] = node._clone(info)
+            node_copy = node_copy._children[i]
+        return copy, node_copy
+
+    def _child_index(self, position: Tuple[int, int]) -> int:
+        """Return the index of the child of this Block that contains
+        <position>.
+
+        Precondition: this Block has children and contains <position>.
+        """
+        x, y = position
+        for i in range(3):
+            child = self.children[i]
+            if child.position[0] <= x < child.position[0] + child.size and \
+                    child.position[1] <= y < child.position[1] + child.size:
+                return i
+        return 3
+
+    def _clone(self, info: _BoardInfo) -> Block:
+        """Return a copy of this Block that belongs to the board described by
+        <info> and shares this Block's children.
+        """
+        clone = _new_block(self.position, self.size, self._colour, self.level,
+                           info)
         if self.children:
-            # block has children
-            # copies of the children
-            upper_right = self.children[0].create_copy()
-            upper_left = self.children[1].create_copy()
-            lower_left = self.children[2].create_copy()
-            lower_right = self.children[3].create_copy()
-            # copy of parent
-            copy = Block(self.position,  # this is a tuple so no aliasing
-                         self.size,
-                         None,  # colour is none
-                         self.level,
-                         self.max_depth)
-            # adding children to parent
-            copy.children = [upper_right, upper_left, lower_left, lower_right]
-            return copy
+            # the children were brought up to date before being shared
+            clone._children = self._children[:]
+            clone._shares_children = True
+        return clone
+
+    def _unshare(self) -> None:
+        """Replace the children of this Block by copies that belong only to
+        this Block's board, if they are shared with another board.
+        """
+        if self._shares_children:
+            self._children = [child._clone(self._info)
+                              for child in self._children]
+            self._shares_children = False
+
+
+class MoveJournal:
+    """A record of the moves made on one board, each of which can be undone,
+    most recent first.
+
+    A move is an (action, direction, block) tuple, as made by a Player, where
+    the action is one of 'rotate', 'swap', 'smash', 'paint', 'combine' or
+    'pass'.
+
+    === Public Attributes ===
+    board:
+        The root of the board the moves are made on.
+    """
+    # === Private Attributes ===
+    # _entries:
+    #     For each move that was made, in order, its action, its direction,
+    #     the indices of the children followed from <board> down to its block,
+    #     and whatever is needed to undo it: the block's old colour for a
+    #     paint or a smash, and its old children for a combine.
+    board: Block
+    _entries: List[Tuple[str, Optional[int], List[int], object]]
+
+    def __init__(self, board: Block) -> None:
+        """Initialize an empty journal for <board>.
+        """
+        self.board = board
+        self._entries = []
+
+    def __len__(self) -> int:
+        """Return the number of moves that can be undone.
+        """
+        return len(self._entries)
+
+    def apply(self, move: Tuple[str, Optional[int], Block],
+              colour: Optional[Tuple[int, int, int]] = None) -> bool:
+        """Make <move> on the board and record it, painting with <colour> if
+        it is a paint.
+
+        Return True iff the move was performed. Moves that are not performed
+        are not recorded, and a paint is not performed without a <colour>.
+
+        Precondition: the block of <move> was reached from <board> since the
+        board last changed.
+        """
+        action, direction, block = move
+        path = self._path_to(block)
+        data = None
+        if action == 'rotate':
+            performed = block.rotate(direction)
+        elif action == 'swap':
+            performed = block.swap(direction)
+        elif action == 'smash':
+            data = block._colour
+            performed = block.smash()
+        elif action == 'paint':
+            data = block._colour
+            performed = colour is not None and block.paint(colour)
+        elif action == 'combine':
+            data = (block._children, block._turns, block._stale,
+                    block._shares_children)
+            performed = block.combine()
         else:
-            # block has no children
-            return Block(self.position,  # this is a tuple so no aliasing
-                         self.size,
-                         self.colour,  # this is a tuple so no aliasing
-                         self.level,
-                         self.max_depth)
+            # passing always succeeds and changes nothing
+            performed = True
+
+        if performed:
+            self._entries.append((action, direction, path, data))
+        return performed
+
+    def undo(self) -> None:
+        """Undo the most recent move recorded in this journal.
 
+        Precondition: len(self) > 0
+        """
+        action, direction, path, data = self._entries.pop()
+        block = self.board
+        for i in path:
+            block = block.children[i]
+
+        if action == 'rotate':
+            block.rotate(4 - direction)
+        elif action == 'swap':
+            block.swap(direction)
+        elif action in ('smash', 'paint'):
+            old = block._info.changing(block)
+            block._set_children([])
+            block._colour = data
+            block._info.changed(block, old)
+        elif action == 'combine':
+            old = block._info.changing(block)
+            block._colour = None
+            block._children, block._turns, block._stale, \
+                block._shares_children = data
+            block._info.changed(block, old)
+
+    def undo_all(self) -> None:
+        """Undo every move recorded in this journal, most recent first.
+        """
+        while self._entries:
+            self.undo()
+
+    def _path_to(self, block: Block) -> List[int]:
+        """Return the indices of the children followed from <board> down to
+        <block>.
+
+        Precondition: <block> is <board> or one of its descendants.
+        """
+        path = []
+        node = self.board
+        while node is not block:
+            i = node._child_index(block.position)
+            path.append(i)
+            node = node.children[i]
+        return path
 
 
 if __name__ == '__main__':
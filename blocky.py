@@ -29,6 +29,7 @@ import pygame
 from actions import ACTION_MESSAGE, ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,\
     SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE, ACTION_PENALTY
 from block import Block
+from goal import score_all
 from player import Player
 from renderer import Renderer
 from settings import ANIMATION_DURATION
@@ -115,11 +116,30 @@ class GameData:
         """
         goal_score = self.players[player_id].goal.score(self.board)
 
-        penalty = self.smashes[player_id] * ACTION_PENALTY[SMASH] + \
-                  self.combines[player_id] * ACTION_PENALTY[COMBINE] + \
-                  self.paints[player_id] * ACTION_PENALTY[PAINT]
+        return goal_score, self._penalty(player_id)
 
-        return goal_score, penalty
+    def calculate_all_scores(self) -> Dict[int, Tuple[int, int]]:
+        """Return a dictionary mapping each player's id to a tuple containing
+        first their score based on their goal in the game and second the
+        deductions from their score based on the actions they've taken, as
+        calculate_score would.
+
+        The board is walked once for all the players' goals together.
+        """
+        goal_scores = score_all([player.goal for player in self.players],
+                                self.board)
+        scores = {}
+        for player, goal_score in zip(self.players, goal_scores):
+            scores[player.id] = (goal_score, self._penalty(player.id))
+        return scores
+
+    def _penalty(self, player_id: int) -> int:
+        """Return the deductions from <player_id>'s score based on the actions
+        they've taken.
+        """
+        return self.smashes[player_id] * ACTION_PENALTY[SMASH] + \
+            self.combines[player_id] * ACTION_PENALTY[COMBINE] + \
+            self.paints[player_id] * ACTION_PENALTY[PAINT]
 
 
 class GameState:
@@ -337,12 +357,16 @@ class GameOverState(GameState):
         """Initialize this GameState.
         """
         self._scores = []
+        all_scores = data.calculate_all_scores()
         for p in data.players:
-            goal_score, penalty = data.calculate_score(p.id)
+            goal_score, penalty = all_scores[p.id]
             self._scores.append((p.id, goal_score, penalty))
 
         self._winner = max(self._scores, key=lambda item: item[1] - item[2])[0]
 
+        for p in data.players:
+            p.close()
+
     def process_event(self, event: pygame.event.Event) -> None:
         # Simply ignore the event
         return
@@ -373,7 +397,7 @@ if __name__ == '__main__':
         'allowed-io': ['run_game'],
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'pygame', '__future__',
-            'block', 'player', 'renderer', 'settings', 'actions'
+            'block', 'goal', 'player', 'renderer', 'settings', 'actions'
         ],
         'generated-members': 'pygame.*'
     })
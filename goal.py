@@ -22,9 +22,11 @@ Misha Schwartz, and Jaisie Sin
 This file contains the hierarchy of Goal classes.
 """
 from __future__ import annotations
+import bisect
 import random
-from typing import List, Tuple
-from block import Block
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from block import Block, palette_index
 from settings import colour_name, COLOUR_LIST
 
 
@@ -85,42 +87,161 @@ def _flatten(block: Block) -> List[List[Tuple[int, int, int]]]:
 
     L[0][0] represents the unit cell in the upper left corner of the Block.
     """
-    # size of unit cell
-    unit_size = 2 ** block.max_depth // 2 ** block.level
-    # if block does not have children (block.children == [])
-    lst = []
-    if block.colour is not None and not block.children:
-        # populating lst with unit cells with only block.colour
-        for i in range(unit_size):
-            # adding empty column
-            lst.append([])
-            for _ in range(unit_size):
-                # populating that column with unit_size items
-                lst[i].append(block.colour)
-
-    else:  # block has children
-
-        # flattening each child first
-        lst0 = _flatten(block.children[0])  # upper right
-        lst1 = _flatten(block.children[1])  # upper left
-        lst2 = _flatten(block.children[2])  # lower left
-        lst3 = _flatten(block.children[3])  # lower right
-
-        # combining the sublists of each child
-        # left blocks
-        for i in range(len(lst1)):
-            # adding the columns together
-            # upper left then lower left
-            lst.append(lst1[i] + lst2[i])
-        # right blocks
-        for i in range(len(lst0)):
-            # adding the rows together
-            # upper right then lower right
-            lst.append(lst0[i] + lst3[i])
+    if block.level == 0:
+        # the board keeps its grid up to date
+        return [column[:] for column in block.cell_grid()]
 
+    # number of unit cells along each side of the block
+    unit_size = 2 ** block.max_depth // 2 ** block.level
+    lst = [[None] * unit_size for _ in range(unit_size)]
+    block.draw_cells(lst, 0, 0)
     return lst
 
 
+def score_all(goals: List[Goal], board: Block) -> List[int]:
+    """Return the score of each goal in <goals> on <board>, in order.
+
+    The board is walked once, and each goal scores the leaves found with
+    score_leaves. So the goals' caches are neither read nor filled, and a
+    BlobGoal finds its blobs from the leaves whatever its method is.
+    """
+    leaves = list(board.leaves(0, 0))
+    return [goal.score_leaves(board, leaves) for goal in goals]
+
+
+class _BlobLabels:
+    """The blobs of one colour on one board, labelled cell by cell and kept up
+    to date as the board changes.
+
+    After a move, only the blobs that touch the changed square, or the cells
+    around it, are labelled again. Every other blob is left as it is, since
+    neither its cells nor the cells around it changed.
+
+    === Attributes ===
+    board:
+        The board whose blobs are labelled.
+    colour:
+        The colour of the blobs.
+
+    === Private Attributes ===
+    _mark:
+        The change mark of <board> when the labels were last brought up to
+        date.
+    _labels:
+        The label of the blob containing each unit cell of <board>, as a
+        list of columns, or -1 for cells of another colour.
+    _sizes:
+        The number of unit cells in the blob with each label.
+    _next_label:
+        The label to give the next new blob.
+    """
+    board: Block
+    colour: Tuple[int, int, int]
+    _mark: Tuple[object, int]
+    _labels: List[List[int]]
+    _sizes: Dict[int, int]
+    _next_label: int
+
+    def __init__(self, board: Block, colour: Tuple[int, int, int]) -> None:
+        """Label the blobs of <colour> on <board>.
+
+        Precondition: <board> is at level 0.
+        """
+        self.board = board
+        self.colour = colour
+        self._relabel_all()
+
+    def largest(self) -> int:
+        """Return the number of unit cells in the largest blob, after bringing
+        the labels up to date with the board.
+        """
+        changes = self.board.changes_since(self._mark)
+        if changes is None:
+            self._relabel_all()
+        elif changes:
+            self._relabel(changes)
+        return max(self._sizes.values(), default=0)
+
+    def _relabel_all(self) -> None:
+        """Label every blob of the board from scratch.
+        """
+        grid = self.board.cell_grid()
+        self._mark = self.board.change_mark()
+        n = len(grid)
+        self._labels = [[-1] * n for _ in range(n)]
+        self._sizes = {}
+        self._next_label = 0
+        self._flood([(column, row) for column in range(n)
+                     for row in range(n)], grid)
+
+    def _relabel(self, changes: List[Tuple[int, int, int]]) -> None:
+        """Label again the blobs that touch any of the squares of unit cells
+        in <changes>, given as (column, row, span), or the cells around them.
+        """
+        grid = self.board.cell_grid()
+        labels = self._labels
+        n = len(grid)
+        # the cells that may now be in a different blob
+        cells = []
+        for x, y, span in changes:
+            for column in range(max(x - 1, 0), min(x + span + 1, n)):
+                for row in range(max(y - 1, 0), min(y + span + 1, n)):
+                    if labels[column][row] >= 0:
+                        cells.extend(self._unlabel(column, row))
+                    if x <= column < x + span and y <= row < y + span:
+                        cells.append((column, row))
+        self._flood(cells, grid)
+        self._mark = self.board.change_mark()
+
+    def _unlabel(self, column: int, row: int) -> List[Tuple[int, int]]:
+        """Remove the label of the blob containing the cell at <column> and
+        <row> from all its cells, and return those cells.
+        """
+        labels = self._labels
+        n = len(labels)
+        label = labels[column][row]
+        del self._sizes[label]
+        labels[column][row] = -1
+        cells = [(column, row)]
+        i = 0
+        while i < len(cells):
+            column, row = cells[i]
+            i += 1
+            for c, r in ((column - 1, row), (column + 1, row),
+                         (column, row - 1), (column, row + 1)):
+                if 0 <= c < n and 0 <= r < n and labels[c][r] == label:
+                    labels[c][r] = -1
+                    cells.append((c, r))
+        return cells
+
+    def _flood(self, cells: List[Tuple[int, int]],
+               grid: List[List[Tuple[int, int, int]]]) -> None:
+        """Give a new label to each blob of unlabelled cells of this colour
+        that contains a cell in <cells>.
+        """
+        labels = self._labels
+        n = len(labels)
+        for start in cells:
+            column, row = start
+            if labels[column][row] >= 0 or grid[column][row] != self.colour:
+                continue
+            label = self._next_label
+            self._next_label += 1
+            labels[column][row] = label
+            blob = [start]
+            i = 0
+            while i < len(blob):
+                column, row = blob[i]
+                i += 1
+                for c, r in ((column - 1, row), (column + 1, row),
+                             (column, row - 1), (column, row + 1)):
+                    if 0 <= c < n and 0 <= r < n and labels[c][r] < 0 and \
+                            grid[c][r] == self.colour:
+                        labels[c][r] = label
+                        blob.append((c, r))
+            self._sizes[label] = len(blob)
+
+
 class Goal:
     """A player goal in the game of Blocky.
 
@@ -130,21 +251,138 @@ class Goal:
     colour:
         The target colour for this goal, that is the colour to which
         this goal applies.
+    cache_limit:
+        The most scores to remember. If it is 0, no scores are remembered.
+    cache_hits:
+        The number of scores that were remembered rather than computed.
+    cache_misses:
+        The number of scores of boards that were computed and remembered.
+
+    === Private Attributes ===
+    _cache:
+        The remembered scores, keyed by the board's Zobrist hash, maximum
+        depth and this goal's colour, least recently used first.
     """
     colour: Tuple[int, int, int]
-
-    def __init__(self, target_colour: Tuple[int, int, int]) -> None:
-        """Initialize this goal to have the given target colour.
+    cache_limit: int
+    cache_hits: int
+    cache_misses: int
+    _cache: OrderedDict[Tuple[int, int, Tuple[int, int, int]], int]
+
+    def __init__(self, target_colour: Tuple[int, int, int],
+                 cache_limit: int = 0) -> None:
+        """Initialize this goal to have the given target colour, remembering up
+        to <cache_limit> scores.
         """
         self.colour = target_colour
+        self.cache_limit = cache_limit
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = OrderedDict()
 
     def score(self, board: Block) -> int:
         """Return the current score for this goal on the given board.
 
         The score is always greater than or equal to 0.
+
+        If <board> is a whole board and the cache is on, the score is
+        remembered, and scores of equal boards are not computed again. When
+        the cache is full, the least recently used score is forgotten.
+        """
+        if self.cache_limit <= 0 or board.level != 0:
+            return self._score(board)
+
+        key = (board.board_hash(), board.max_depth, self.colour)
+        if key in self._cache:
+            self.cache_hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        self.cache_misses += 1
+        score = self._score(board)
+        self._cache[key] = score
+        if len(self._cache) > self.cache_limit:
+            self._cache.popitem(last=False)
+        return score
+
+    def _score(self, board: Block) -> int:
+        """Return the current score for this goal on the given board, without
+        looking in the cache.
+        """
+        raise NotImplementedError
+
+    def score_leaves(self, board: Block,
+                     leaves: List[Tuple[int, int, int, int]]) -> int:
+        """Return the score for this goal on the given board if its leaves
+        were <leaves>, as given by Block.leaves(0, 0), without looking in the
+        cache.
         """
         raise NotImplementedError
 
+    def score_many(self, boards: List[Block]) -> List[int]:
+        """Return the current score for this goal on each board in <boards>,
+        in order.
+
+        Boards that already keep their Zobrist hash up to date, because
+        board_hash was called on them, are scored once for each distinct
+        hash. Every other board is scored on its own, as score would, since
+        hashing it would cost as much as scoring it. The boards are not
+        changed.
+        """
+        scores = []
+        # the score of each distinct board seen so far
+        seen = {}
+        for board in boards:
+            if board.level == 0 and board.keeps_hash():
+                key = (board.board_hash(), board.max_depth)
+                if key not in seen:
+                    seen[key] = self.score(board)
+                scores.append(seen[key])
+            else:
+                scores.append(self.score(board))
+        return scores
+
+    def score_delta(self, board: Block,
+                    move: Tuple[str, Optional[int], Block],
+                    score: Optional[int] = None) -> Optional[int]:
+        """Return how much the score for this goal on <board> would change if
+        <move> were made, without changing or copying <board>.
+
+        <move> is an (action, direction, block) tuple, as made by a Player. A
+        paint is assumed to use this goal's colour. Return None if the move
+        would not be performed, or if it is a smash, whose result is random.
+
+        <score> is the current score for this goal on <board>, if the caller
+        already knows it, so that it is not worked out again for every move.
+
+        Precondition: the block of <move> was reached from <board> since the
+        board last changed.
+        """
+        action, direction, block = move
+        if action == 'pass':
+            return 0
+        x, y = board.cell_of(block)
+        leaves = block.moved_leaves(action, direction, self.colour, x, y)
+        if leaves is None:
+            return None
+        return self._leaves_delta(board, block, x, y, leaves, score)
+
+    def _leaves_delta(self, board: Block, block: Block, x: int, y: int,
+                      leaves: List[Tuple[int, int, int, int]],
+                      score: Optional[int]) -> int:
+        """Return how much the score for this goal on <board> would change if
+        the leaves of <block>, whose upper-left unit cell is at column <x> and
+        row <y>, were replaced by <leaves>.
+
+        <score> is the current score on <board>, or None if it is not known.
+        """
+        span = 2 ** (board.max_depth - block.level)
+        others = [leaf for leaf in board.leaves(0, 0)
+                  if not (x <= leaf[0] < x + span and y <= leaf[1] < y + span)]
+        if score is None:
+            score = self.score(board)
+        return self.score_leaves(board, others + leaves) - score
+
     def description(self) -> str:
         """Return a description of this goal.
         """
@@ -165,28 +403,34 @@ class PerimeterGoal(Goal):
     """
     colour: Tuple[int, int, int]
 
-    def score(self, board: Block) -> int:
-        flat_board = _flatten(board)
-        top_bot_score = 0
-        for inner in flat_board:
-            # adds the score for the top edge, since only the first index in
-            # each column is at the top of a block
-            if inner[0] == self.colour:
-                top_bot_score += 1
-            # does the same for the bottom
-            if inner[-1] == self.colour:
-                top_bot_score += 1
-
-        side_score = 0
-        for i in range(len(flat_board[0])):
-            # Only first and last sublist can add to the score, so just check
-            # those
-            if flat_board[0][i] == self.colour:
-                side_score += 1
-            if flat_board[-1][i] == self.colour:
-                side_score += 1
-
-        return side_score + top_bot_score
+    def _score(self, board: Block) -> int:
+        # only the leaves on the edge can add to the score
+        return self.score_leaves(board, board.border_leaves())
+
+    def _leaves_delta(self, board: Block, block: Block, x: int, y: int,
+                      leaves: List[Tuple[int, int, int, int]],
+                      score: Optional[int]) -> int:
+        side = 2 ** (board.max_depth - board.level)
+        span = 2 ** (board.max_depth - block.level)
+        if 0 < x and 0 < y and x + span < side and y + span < side:
+            # the block is not on the edge, so the perimeter is unchanged
+            return 0
+        return self.score_leaves(board, leaves) - \
+            self.score_leaves(board, block.leaves(x, y))
+
+    def score_leaves(self, board: Block,
+                     leaves: Iterable[Tuple[int, int, int, int]]) -> int:
+        target = palette_index(self.colour)
+        side = 2 ** (board.max_depth - board.level)
+        score = 0
+        for x, y, level, colour_index in leaves:
+            if colour_index == target:
+                span = 2 ** (board.max_depth - level)
+                # each of the leaf's edge cells scores once per side of the
+                # board it is on, so corner cells count twice
+                sides = [x == 0, y == 0, x + span == side, y + span == side]
+                score += span * sides.count(True)
+        return score
 
     def description(self) -> str:
         # creating string representation of colour
@@ -208,12 +452,53 @@ class BlobGoal(Goal):
     colour:
         The target colour for this goal, that is the colour to which
         this goal applies.
+
+    === Private Attributes ===
+    _method:
+        How the blobs are found: 'leaves' joins adjacent leaves of the board
+        without looking at single cells, 'union_find' labels the cells with
+        an iterative union-find pass, 'recursive' searches from each cell
+        with _undiscovered_blob_size, and 'incremental' keeps the blobs of
+        one board labelled between calls.
+    _labels:
+        The labelled blobs of the first board scored, if <_method> is
+        'incremental'. Otherwise None.
     """
     colour: Tuple[int, int, int]
+    _method: str
+    _labels: Optional[_BlobLabels]
+
+    def __init__(self, target_colour: Tuple[int, int, int],
+                 method: str = 'leaves', cache_limit: int = 0) -> None:
+        """Initialize this goal to have the given target colour, finding blobs
+        with the given <method> and remembering up to <cache_limit> scores.
+
+        With the 'incremental' method, the first board scored is followed
+        from one call to the next, and only the blobs near the cells changed
+        by moves are labelled again. Other boards are scored as with
+        'leaves'.
+
+        Precondition: <method> is 'leaves', 'union_find', 'recursive' or
+        'incremental'.
+        """
+        Goal.__init__(self, target_colour, cache_limit)
+        self._method = method
+        self._labels = None
+
+    def _score(self, board: Block) -> int:
+        if self._method == 'incremental' and board.level == 0 and \
+                (self._labels is None or self._labels.board is board):
+            if self._labels is None or self._labels.colour != self.colour:
+                self._labels = _BlobLabels(board, self.colour)
+            return self._labels.largest()
+
+        if self._method in ('leaves', 'incremental'):
+            return self._largest_leaf_blob_size(board, board.leaves(0, 0))
 
-    def score(self, board: Block) -> int:
         # flattened board
         flat_board = _flatten(board)
+        if self._method == 'union_find':
+            return self._largest_blob_size(flat_board)
 
         # making the visited board populated with -1
         visited = []
@@ -233,6 +518,120 @@ class BlobGoal(Goal):
 
         return largest_blob
 
+    def score_leaves(self, board: Block,
+                     leaves: List[Tuple[int, int, int, int]]) -> int:
+        # every method finds the same blobs, so the leaves are used directly
+        return self._largest_leaf_blob_size(board, leaves)
+
+    def _largest_leaf_blob_size(
+            self, board: Block,
+            leaves: Iterable[Tuple[int, int, int, int]]) -> int:
+        """Return the number of unit cells in the largest connected blob of
+        this Goal's target colour in <board>, whose leaves are <leaves>.
+
+        The leaves of the target colour are joined to the leaves of the target
+        colour that touch their right and lower sides, and each blob is
+        weighted by the area of its leaves, so the work depends on the number
+        of leaves rather than the number of unit cells.
+        """
+        target = palette_index(self.colour)
+        # each leaf of the target colour as (column, row, span), and the
+        # leaves whose left side (or top side) is on each column (or row),
+        # as lists of (start, end, leaf) sorted by start
+        targets = []
+        by_column = {}
+        by_row = {}
+        for x, y, level, colour_index in leaves:
+            if colour_index == target:
+                span = 2 ** (board.max_depth - level)
+                by_column.setdefault(x, []).append((y, y + span, len(targets)))
+                by_row.setdefault(y, []).append((x, x + span, len(targets)))
+                targets.append((x, y, span))
+        for side in list(by_column.values()) + list(by_row.values()):
+            side.sort()
+
+        parent = list(range(len(targets)))
+        area = [span * span for _, _, span in targets]
+
+        def find(leaf: int) -> int:
+            """Return the representative of the blob containing <leaf>."""
+            while parent[leaf] != leaf:
+                # halve the path on the way up
+                parent[leaf] = parent[parent[leaf]]
+                leaf = parent[leaf]
+            return leaf
+
+        for leaf, (x, y, span) in enumerate(targets):
+            # the leaves beside this one start on the column after it, and
+            # the leaves below it on the row after it
+            for side, start in ((by_column.get(x + span), y),
+                                (by_row.get(y + span), x)):
+                if side is None:
+                    continue
+                # the leaves on a side do not overlap, so the ones that
+                # touch this leaf are consecutive
+                i = bisect.bisect_left(side, (start + span,)) - 1
+                while i >= 0 and side[i][1] > start:
+                    root1 = find(leaf)
+                    root2 = find(side[i][2])
+                    if root1 != root2:
+                        if area[root1] < area[root2]:
+                            root1, root2 = root2, root1
+                        parent[root2] = root1
+                        area[root1] += area[root2]
+                    i -= 1
+
+        return max([area[leaf] for leaf in range(len(targets))
+                    if parent[leaf] == leaf], default=0)
+
+    def _largest_blob_size(self,
+                           board: List[List[Tuple[int, int, int]]]) -> int:
+        """Return the size of the largest connected blob of this Goal's target
+        colour in <board>, the flattened board.
+
+        Each cell of the target colour is joined to the cells of the target
+        colour to its left and above it in a union-find structure, so no
+        recursion is needed however large the blobs are.
+        """
+        n = len(board)
+        # cell (column, row) is number column * n + row
+        parent = list(range(n * n))
+        size = [1] * (n * n)
+
+        def find(cell: int) -> int:
+            """Return the representative of the blob containing <cell>."""
+            while parent[cell] != cell:
+                # halve the path on the way up
+                parent[cell] = parent[parent[cell]]
+                cell = parent[cell]
+            return cell
+
+        def union(cell1: int, cell2: int) -> None:
+            """Join the blobs containing <cell1> and <cell2>."""
+            root1 = find(cell1)
+            root2 = find(cell2)
+            if root1 != root2:
+                if size[root1] < size[root2]:
+                    root1, root2 = root2, root1
+                parent[root2] = root1
+                size[root1] += size[root2]
+
+        largest_blob = 0
+        for column in range(n):
+            for row in range(n):
+                if board[column][row] == self.colour:
+                    cell = column * n + row
+                    if column > 0 and board[column - 1][row] == self.colour:
+                        union(cell, cell - n)
+                    if row > 0 and board[column][row - 1] == self.colour:
+                        union(cell, cell - 1)
+
+        for cell in range(n * n):
+            if parent[cell] == cell and size[cell] > largest_blob and \
+                    board[cell // n][cell % n] == self.colour:
+                largest_blob = size[cell]
+        return largest_blob
+
     def _undiscovered_blob_size(self, pos: Tuple[int, int],
                                 board: List[List[Tuple[int, int, int]]],
                                 visited: List[List[int]]) -> int:
@@ -352,7 +751,7 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'block', 'settings',
-            'math', '__future__'
+            'math', '__future__', 'bisect', 'collections'
         ],
         'max-attributes': 15
     })
@@ -0,0 +1,78 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin
+
+=== Module Description ===
+
+This file contains a generator of the legal moves on a Blocky board.
+"""
+from typing import List, Optional, Tuple
+
+from block import Block
+from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PAINT, COMBINE
+
+# The actions possible on a Block with children, in the order they are listed
+_PARENT_ACTIONS = [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,
+                   SWAP_HORIZONTAL, SWAP_VERTICAL]
+
+
+def legal_moves(board: Block, colour: Tuple[int, int, int]) \
+        -> List[Tuple[str, Optional[int], Block]]:
+    """Return every move other than PASS that can be successfully performed
+    on <board> by a player who paints with <colour>, as (action, direction,
+    block) tuples like those made by a Player.
+
+    The Blocks are listed in pre-order, children in order, and the moves on
+    each Block in the order SMASH, ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,
+    SWAP_HORIZONTAL, SWAP_VERTICAL, PAINT, COMBINE. Whether a move is legal is
+    decided without making it, so <board> is not mutated.
+
+    >>> from settings import COLOUR_LIST
+    >>> board = Block((0, 0), 750, COLOUR_LIST[0], 0, 1)
+    >>> [move[0] for move in legal_moves(board, COLOUR_LIST[1])]
+    ['smash']
+    """
+    moves = []
+    blocks = [board]
+    while blocks:
+        block = blocks.pop()
+        if block.smashable():
+            moves.append((SMASH[0], SMASH[1], block))
+        if block.children:
+            for action in _PARENT_ACTIONS:
+                moves.append((action[0], action[1], block))
+            # the children are popped in order
+            blocks.extend(reversed(block.children))
+        elif block.paintable(colour):
+            moves.append((PAINT[0], PAINT[1], block))
+        if block.combinable():
+            moves.append((COMBINE[0], COMBINE[1], block))
+    return moves
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', 'actions', 'block', 'settings'
+        ]
+    })
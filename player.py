@@ -22,15 +22,20 @@ Misha Schwartz, and Jaisie Sin.
 This file contains the hierarchy of player classes.
 """
 from __future__ import annotations
-from typing import List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Type
+import math
 import random
+import time
 import pygame
 
-from block import Block
+from block import Block, MoveJournal
 from goal import Goal, generate_goals
+from moves import legal_moves
+from quadtree import LinearBoard
 
 from actions import KEY_ACTION, ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
-    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE, ACTION_PENALTY
 
 
 def create_players(num_human: int, num_random: int, smart_players: List[int]) \
@@ -63,6 +68,43 @@ def create_players(num_human: int, num_random: int, smart_players: List[int]) \
     return players
 
 
+# the unit cell of each pixel along one side of a block, by (size, depth)
+_AXIS_CELLS: Dict[Tuple[int, int], List[int]] = {}
+
+# the index of the child in the given (right half, lower half) of a block
+_CHILD_INDEX = {(1, 0): 0, (0, 0): 1, (0, 1): 2, (1, 1): 3}
+
+
+def _axis_cells(size: int, depth: int) -> List[int]:
+    """Return a list L where L[p] is the unit cell that contains pixel p along
+    one side of a Block of <size> pixels with <depth> levels below it.
+
+    Bit depth - 1 - k of L[p] is 1 iff pixel p is in the right (or lower)
+    child of its block at k levels below the Block. The children of a block
+    are half its size rounded, as in Block, so the split is not always at
+    the middle pixel.
+    """
+    key = (size, depth)
+    if key not in _AXIS_CELLS:
+        # the size of the blocks at each level below the Block
+        sizes = []
+        for _ in range(depth):
+            size = round(size / 2.0)
+            sizes.append(size)
+        cells = []
+        for pixel in range(key[0]):
+            cell = 0
+            start = 0
+            for child_size in sizes:
+                cell <<= 1
+                if pixel >= start + child_size:
+                    cell |= 1
+                    start += child_size
+            cells.append(cell)
+        _AXIS_CELLS[key] = cells
+    return _AXIS_CELLS[key]
+
+
 def _get_block(block: Block, location: Tuple[int, int], level: int) -> \
         Optional[Block]:
     """Return the Block within <block> that is at <level> and includes
@@ -78,33 +120,52 @@ def _get_block(block: Block, location: Tuple[int, int], level: int) -> \
 
     If no Block can be found at <location>, return None.
 
+    The location is turned into a unit cell with one table lookup per
+    coordinate, and the path down to the Block is read off the bits of the
+    cell, so this takes O(level) time.
+
     Preconditions:
         - 0 <= level <= max_depth
     """
-    # Check if it's the deepest block or if it is the block that is wanted
-    if not block.children or level == 0 and 0 <= location[0] and 0 <= \
-            location[1]:
-        return block
-    # recurse through the children
-    else:
-        section = block.size // 2
-        # check if it within the left half of pixels
-        if 0 <= block.position[0] <= location[0] < block.position[0] + section:
-            if 0 <= block.position[1] <= location[1] < block.position[1] + \
-                    section:
-                return _get_block(block.children[1], location, level - 1)
-            else:
-                return _get_block(block.children[2], location, level - 1)
-        # otherwise check if it is within the right half of pixels
-        elif 0 <= block.position[0] + section <= location[0] < block.size + \
-                block.position[0]:
-            if 0 <= block.position[1] <= location[1] < block.position[1] + \
-                    section:
-                return _get_block(block.children[0], location, level - 1)
-            elif block.position[1] + section <= location[1] < block.size + \
-                    block.position[1]:
-                return _get_block(block.children[3], location, level - 1)
-        return None
+    return _get_blocks(block, [location], level)[0]
+
+
+def _get_blocks(block: Block, locations: List[Tuple[int, int]],
+                level: int) -> List[Optional[Block]]:
+    """Return the Block within <block> that is at <level> and includes each
+    location in <locations>, or None if there is none, as _get_block would.
+
+    Locations in the same Block share one walk down the tree.
+
+    Preconditions:
+        - 0 <= level <= max_depth
+    """
+    depth = block.max_depth - block.level
+    cells = _axis_cells(block.size, depth)
+    steps = min(level, depth)
+    # cells in the same Block at <level> agree on their first <steps> bits
+    shift = depth - steps
+    x0, y0 = block.position
+    found = {}
+    result = []
+    for x, y in locations:
+        x -= x0
+        y -= y0
+        if not (0 <= x < block.size and 0 <= y < block.size):
+            result.append(None)
+            continue
+        key = (cells[x] >> shift, cells[y] >> shift)
+        if key not in found:
+            column, row = key
+            node = block
+            for bit in range(steps - 1, -1, -1):
+                if not node.children:
+                    break
+                node = node.children[_CHILD_INDEX[(column >> bit & 1,
+                                                   row >> bit & 1)]]
+            found[key] = node
+        result.append(found[key])
+    return result
 
 
 class Player:
@@ -152,6 +213,12 @@ class Player:
         """
         raise NotImplementedError
 
+    def close(self) -> None:
+        """Release anything this player keeps between turns, once the game
+        is over.
+        """
+        return
+
 
 def _create_move(action: Tuple[str, Optional[int]], block: Block) -> \
         Tuple[str, Optional[int], Block]:
@@ -260,29 +327,30 @@ class RandomPlayer(Player):
         if not self._proceed:
             return None  # Do not remove
 
-        board_copy = board.create_copy()
-        rand_x = random.randint(0, board_copy.size)
-        rand_y = random.randint(0, board_copy.size)
+        rand_x = random.randint(0, board.size)
+        rand_y = random.randint(0, board.size)
         rand_level = random.randint(0, board.max_depth)
 
-        rand_block = _get_block(board_copy, (rand_x, rand_y), rand_level)
+        actual_block = _get_block(board, (rand_x, rand_y), rand_level)
 
-        # this is to in case rand_block is None
+        # this is to in case actual_block is None
         # location does not include the bottom or right edge
         # so sometimes _get_block returns None
-        while rand_block is None:
+        while actual_block is None:
             rand_x = random.randint(0, board.size)
             rand_y = random.randint(0, board.size)
             rand_level = random.randint(0, board.max_depth)
-            rand_block = _get_block(board_copy,
-                                    (rand_x, rand_y),
-                                    rand_level)
+            actual_block = _get_block(board,
+                                      (rand_x, rand_y),
+                                      rand_level)
+
+        # only the path down to the block is copied, the rest is shared
+        rand_block = board.path_copy(actual_block)[1]
 
         # Generate a random number to then choose a move
         moves = ['smash', 'swap_hori', 'swap_vert', 'rotate_clock',
                  'rotate_counter', 'paint', 'combine']
         move = None
-        actual_block = _get_block(board, (rand_x, rand_y), rand_level)
         # Checks if the random action chosen by a random number in the range of
         # the length of list <moves> is a valid action.
         # if it isn't valid, removes that move from the list and tries again
@@ -323,6 +391,8 @@ class RandomPlayer(Player):
             else:
                 if rand_block.combine():
                     move = _create_move(COMBINE, actual_block)
+                else:
+                    moves.remove('combine')
 
         if not moves:
             move = _create_move(PASS, actual_block)
@@ -333,7 +403,7 @@ class RandomPlayer(Player):
 
 class SmartPlayer(Player):
     """ a Player that picks the best move out of
-    self._difficulty number of random moves
+    self._difficulty number of random moves, or out of every legal move
 
     === Private Attributes ===
     _proceed:
@@ -341,16 +411,44 @@ class SmartPlayer(Player):
       wait.
     _difficulty: int representing the how how difficult it is
       to play against this player
+    _exhaustive: True when the player should try every legal move instead
+      of self._difficulty random ones
+    _workers: the number of processes the random moves are split across
+    _pool: the processes the random moves are scored in, or None if they
+      have not been started
     """
     _proceed: bool
     _difficulty: int
+    _exhaustive: bool
+    _workers: int
+    _pool: Optional[ProcessPoolExecutor]
+
+    def __init__(self, player_id: int, goal: Goal, difficulty: int,
+                 exhaustive: bool = False, workers: int = 1) -> None:
+        """Initialize this SmartPlayer with the given <player_id>, <goal> and
+        <difficulty>.
 
-    def __init__(self, player_id: int, goal: Goal, difficulty: int) -> None:
+        If <exhaustive> is True, <difficulty> is ignored, and every legal move
+        is scored on each turn. Otherwise, if <workers> is more than 1, the
+        random moves are split across that many processes, which are started
+        on the first turn and kept until close is called when the game ends.
 
+        Precondition: workers >= 1
+        """
         Player.__init__(self, player_id, goal)
         self._difficulty = difficulty
+        self._exhaustive = exhaustive
+        self._workers = workers
+        self._pool = None
         self._proceed = False
 
+    def close(self) -> None:
+        """Stop the processes this player scores moves in, if any.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
     def get_selected_block(self, board: Block) -> Optional[Block]:
         return None
 
@@ -374,24 +472,33 @@ class SmartPlayer(Player):
         if not self._proceed:
             return None  # Do not remove
 
+        if self._exhaustive:
+            self._proceed = False  # Must set to False before returning!
+            return self._best_move(board)
+
+        if self._workers > 1 and self._difficulty > 1:
+            self._proceed = False  # Must set to False before returning!
+            return self._parallel_move(board)
+
         # assume that current score is best possible score
-        best_score = self.goal.score(board)
+        current_score = self.goal.score(board)
+        best_score = current_score
         action = "pass"   # string representation of move
         direction = None  # int for direction for rotate or swap
-        block_copy = None  # the block being operated on in the copy of board
+        block = board  # the block being operated on
 
         # generating self._difficulty number of random valid moves
         num_moves = self._difficulty
         for _ in range(num_moves):
             # find random move
             new_action, new_direction, rand_block, new_score \
-                = self._generate_random_move(board)
+                = self._generate_random_move(board, current_score)
 
             # find score for this random move
             # disregard any penalties
             if new_score > best_score:
                 best_score = new_score
-                block_copy = rand_block
+                block = rand_block
                 action = new_action
                 direction = new_direction
 
@@ -399,36 +506,86 @@ class SmartPlayer(Player):
         # print("action:" + action)
         # print("direction: " + str(direction))
 
-        # finding the parallel block on board as block on board_copy
-        block = board
-        if action != "pass":
-            block = _get_block(board, block_copy.position, block_copy.level)
-
         self._proceed = False  # Must set to False before returning!
 
         return action, direction, block
 
-    def _generate_random_move(self, board: Block) ->\
+    def _parallel_move(self, board: Block) -> \
+            Tuple[str, Optional[int], Block]:
+        """Return the best of self._difficulty random moves, like
+        generate_move, with the moves split across self._workers processes.
+
+        Each process is sent <board> once, as a LinearBoard, and sends back
+        only the best of its moves, with the block given by its position and
+        level.
+
+        board is NOT mutated
+        """
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self._workers)
+        linear = LinearBoard.from_block(board)
+        workers = min(self._workers, self._difficulty)
+        futures = []
+        for i in range(workers):
+            # the first difficulty % workers processes get one more move
+            count = self._difficulty // workers + \
+                (i < self._difficulty % workers)
+            futures.append(self._pool.submit(
+                _best_random_move, linear, type(self.goal), self.goal.colour,
+                count, random.getrandbits(64)))
+
+        action, direction, block = _create_move(PASS, board)
+        best_score = self.goal.score(board)
+        for future in futures:
+            new_action, new_direction, position, level, new_score = \
+                future.result()
+            if new_score > best_score:
+                best_score = new_score
+                action = new_action
+                direction = new_direction
+                block = _get_block(board, position, level)
+        return action, direction, block
+
+    def _best_move(self, board: Block) -> Tuple[str, Optional[int], Block]:
+        """Return the legal move that results in the highest score for this
+        player's goal, or a pass if no move raises the score.
+
+        Ties go to the move that comes first in legal_moves, so the same board
+        always gets the same move. Smashes are not considered, since their
+        result is random.
+
+        board is NOT mutated
+        """
+        best_move = _create_move(PASS, board)
+        best_delta = 0
+        score = self.goal.score(board)
+        for move in legal_moves(board, self.goal.colour):
+            if move[0] != SMASH[0]:
+                delta = self.goal.score_delta(board, move, score)
+                if delta is not None and delta > best_delta:
+                    best_move = move
+                    best_delta = delta
+        return best_move
+
+    def _generate_random_move(self, board: Block, score: int) ->\
             Tuple[str, int, Block, int]:
         """return a 4 element Tuple that represents a move and score
-        (action, direction, block(on copy of board), score)
+        (action, direction, block(on board), score)
+        <score> is the current score of board
         board is NOT mutated
         """
         is_valid_move = False
 
         # for pyTA
-        board_copy = None
         new_action = None
         new_direction = None
         rand_block = None
+        new_score = score
 
         while not is_valid_move:
             # defining this variable since it's not always defined below
             new_direction = None
 
-            # copy of board
-            board_copy = board.create_copy()
-
             # find random action, there are 7 possible actions
             rand_action = random.randint(0, 6)
 
@@ -436,7 +593,7 @@ class SmartPlayer(Player):
             rand_x = random.randint(0, board.size)
             rand_y = random.randint(0, board.size)
             rand_level = random.randint(0, board.max_depth)
-            rand_block = _get_block(board_copy,
+            rand_block = _get_block(board,
                                     (rand_x, rand_y),
                                     rand_level)
 
@@ -447,7 +604,7 @@ class SmartPlayer(Player):
                 rand_x = random.randint(0, board.size)
                 rand_y = random.randint(0, board.size)
                 rand_level = random.randint(0, board.max_depth)
-                rand_block = _get_block(board_copy,
+                rand_block = _get_block(board,
                                         (rand_x, rand_y),
                                         rand_level)
 
@@ -455,52 +612,394 @@ class SmartPlayer(Player):
                 # Note: although smash won't guarantee the same score
                 # still treat it like other actions -> piazza @1719
                 new_action = 'smash'
-                if rand_block.smash():
+                # copy of board, sharing everything but the path to
+                # rand_block
+                board_copy, block_copy = board.path_copy(rand_block)
+                if block_copy.smash():
                     # if move is valid
                     is_valid_move = True
+                    new_score = self.goal.score(board_copy)
 
-            elif rand_action == 1:
-                new_action = 'swap'
-                new_direction = 0  # horizontal swap
-                if rand_block.swap(0):
+            else:
+                new_action, new_direction = [
+                    SWAP_HORIZONTAL, SWAP_VERTICAL, ROTATE_CLOCKWISE,
+                    ROTATE_COUNTER_CLOCKWISE, PAINT, COMBINE][rand_action - 1]
+                # the change in score is worked out without making the move
+                delta = self.goal.score_delta(
+                    board, (new_action, new_direction, rand_block), score)
+                if delta is not None:
                     # if move is valid
                     is_valid_move = True
+                    new_score = score + delta
+
+        return new_action, new_direction, rand_block, new_score
+
+
+class _SearchNode:
+    """A board reached in an MCTSPlayer's search, by making the moves on the
+    path to it from the root.
+
+    A move is stored as (action, direction, position, level), where position
+    and level locate its block, so that it can be found again on the board
+    after other moves are undone.
+
+    === Attributes ===
+    move:
+        The move made to reach this board from its parent, or None for the
+        root.
+    penalty:
+        The penalty for move.
+    visits:
+        The number of searches that have passed through this board.
+    total:
+        The sum of the values those searches ended with.
+    children:
+        The boards reached from this one that have been searched.
+    untried:
+        The moves from this board that have no child yet, or None if they
+        have not been listed.
+    """
+    move: Optional[Tuple[str, Optional[int], Tuple[int, int], int]]
+    penalty: int
+    visits: int
+    total: float
+    children: List[_SearchNode]
+    untried: Optional[List[Tuple[str, Optional[int], Tuple[int, int], int]]]
+
+    def __init__(self, move: Optional[Tuple[str, Optional[int],
+                                            Tuple[int, int], int]]) -> None:
+        """Initialize an unsearched node reached by <move>.
+        """
+        self.move = move
+        self.penalty = 0 if move is None else ACTION_PENALTY[move[:2]]
+        self.visits = 0
+        self.total = 0.0
+        self.children = []
+        self.untried = None
+
+    def select(self, exploration: float) -> _SearchNode:
+        """Return the child of this node with the highest UCT value, the
+        first one on a tie.
+
+        Precondition: every child has been visited at least once.
+        """
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda child: (
+            child.total / child.visits +
+            exploration * math.sqrt(log_visits / child.visits)))
 
-            elif rand_action == 2:
-                new_action = 'swap'
-                new_direction = 1  # vertical swap
-                if rand_block.swap(1):
-                    # if move is valid
-                    is_valid_move = True
 
-            elif rand_action == 3:
-                new_action = 'rotate'
-                new_direction = 1  # clockwise rotation
-                if rand_block.rotate(1):
-                    # if move is valid
-                    is_valid_move = True
+class MCTSPlayer(Player):
+    """A Player that picks its move with a Monte Carlo tree search, limited by
+    a number of iterations or a number of seconds per move.
 
-            elif rand_action == 4:
-                new_action = 'rotate'
-                new_direction = 3  # counter-clockwise rotation
-                if rand_block.rotate(3):
-                    # if move is valid
-                    is_valid_move = True
+    Each iteration follows the tree of searched moves down by UCT, adds one
+    new move to it, makes random moves from there as a RandomPlayer would, and
+    then adds the score of the board minus the penalties of every move made
+    to the value of each move on the way. The move from the root that was
+    searched the most is played, unless passing is worth as much.
 
-            elif rand_action == 5:
-                new_action = 'paint'
-                if rand_block.paint(self.goal.colour):
-                    # if move is valid
-                    is_valid_move = True
+    Smashes are left out of the tree, since their result is random, but they
+    can be made during the random moves.
 
-            elif rand_action == 6:
-                new_action = 'combine'
-                if rand_block.combine():
-                    # if move is valid
-                    is_valid_move = True
+    === Private Attributes ===
+    _proceed:
+      True when the player should make a move, False when the player should
+      wait.
+    _iterations: the most iterations to search for, or None for no limit
+    _time_limit: the most seconds to search for, or None for no limit
+    _rollout_depth: the number of random moves made after a new move
+    _exploration: how much UCT favours moves that have been searched less,
+      in points of score
+    """
+    _proceed: bool
+    _iterations: Optional[int]
+    _time_limit: Optional[float]
+    _rollout_depth: int
+    _exploration: float
+
+    def __init__(self, player_id: int, goal: Goal,
+                 iterations: Optional[int] = None,
+                 time_limit: Optional[float] = None, rollout_depth: int = 1,
+                 exploration: float = 2.0) -> None:
+        """Initialize this MCTSPlayer with the given <player_id> and <goal>,
+        to search for at most <iterations> iterations and at most <time_limit>
+        seconds per move.
+
+        At least one iteration is always searched. Raise ValueError if both
+        <iterations> and <time_limit> are None, since the search would never
+        end.
+        """
+        if iterations is None and time_limit is None:
+            raise ValueError('MCTSPlayer needs an iteration or time limit')
+        Player.__init__(self, player_id, goal)
+        self._iterations = iterations
+        self._time_limit = time_limit
+        self._rollout_depth = rollout_depth
+        self._exploration = exploration
+        self._proceed = False
+
+    def get_selected_block(self, board: Block) -> Optional[Block]:
+        return None
+
+    def process_event(self, event: pygame.event.Event) -> None:
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self._proceed = True
+
+    def generate_move(self, board: Block) ->\
+            Optional[Tuple[str, Optional[int], Block]]:
+        """Return the move from <board> that was searched the most, or PASS if
+        the searches through it were not worth more, on average, than the
+        score of <board>.
+
+        This function does not mutate <board>.
+        """
+        if not self._proceed:
+            return None  # Do not remove
+
+        start = time.perf_counter()
+        self._proceed = False  # Must set to False before returning!
+        journal = MoveJournal(board.create_copy())
+        root = _SearchNode(None)
+        root.untried = self._tree_moves(board)
+        if not root.untried:
+            return _create_move(PASS, board)
+
+        iterations = 0
+        while iterations == 0 or (
+                (self._iterations is None or iterations < self._iterations)
+                and (self._time_limit is None or
+                     time.perf_counter() - start < self._time_limit)):
+            self._search(root, journal)
+            iterations += 1
+
+        best = max(root.children, key=lambda child: child.visits)
+        if best.total / best.visits <= self.goal.score(board):
+            return _create_move(PASS, board)
+        action, direction, position, level = best.move
+        return action, direction, _get_block(board, position, level)
+
+    def _search(self, root: _SearchNode, journal: MoveJournal) -> None:
+        """Search once from <root>, the board of <journal>, and leave that
+        board as it was.
+        """
+        board = journal.board
+        path = [root]
+        node = root
+        # follow the searched moves down while every move has a child
+        while node.untried is not None and not node.untried and \
+                node.children:
+            node = node.select(self._exploration)
+            self._apply(journal, node.move)
+            path.append(node)
+
+        if node.untried is None:
+            node.untried = self._tree_moves(board)
+        if node.untried:
+            # add a move that has not been searched yet
+            move = node.untried.pop(random.randrange(len(node.untried)))
+            child = _SearchNode(move)
+            node.children.append(child)
+            self._apply(journal, move)
+            path.append(child)
+
+        # the player could stop after any of the random moves, so the search
+        # is worth the best score, less penalties, seen along it
+        penalty = sum(node.penalty for node in path)
+        value = self.goal.score(board) - penalty
+        rollout = RandomPlayer(self.id, self.goal)
+        for _ in range(self._rollout_depth):
+            rollout._proceed = True
+            move = rollout.generate_move(board)
+            journal.apply(move, self.goal.colour)
+            penalty += ACTION_PENALTY[move[:2]]
+            value = max(value, self.goal.score(board) - penalty)
+
+        for node in path:
+            node.visits += 1
+            node.total += value
+        journal.undo_all()
+
+    def _tree_moves(self, board: Block) -> \
+            List[Tuple[str, Optional[int], Tuple[int, int], int]]:
+        """Return the legal moves on <board> other than smashes, stored as in
+        a _SearchNode.
+        """
+        return [(action, direction, block.position, block.level)
+                for action, direction, block in
+                legal_moves(board, self.goal.colour) if action != SMASH[0]]
+
+    def _apply(self, journal: MoveJournal,
+               move: Tuple[str, Optional[int], Tuple[int, int], int]) -> None:
+        """Make <move>, stored as in a _SearchNode, on the board of <journal>.
+        """
+        action, direction, position, level = move
+        journal.apply((action, direction,
+                       _get_block(journal.board, position, level)),
+                      self.goal.colour)
+
+
+class BeamSearchPlayer(Player):
+    """A Player that looks <depth> moves ahead, keeping only the <width> best
+    boards reached after each move.
+
+    A board is worth its score for this player's goal, less the penalties of
+    the moves made to reach it. Boards reached by more than one line of
+    moves are only searched from once, along the line that is worth the most,
+    by looking them up by board_hash in a table of the boards seen this turn.
+    The first move of the line to the best board seen is played, or PASS if
+    no board is worth more than the current score.
+
+    A smash is searched with one random result, so a line through it is only
+    as good as that result.
+
+    === Private Attributes ===
+    _proceed:
+      True when the player should make a move, False when the player should
+      wait.
+    _depth: the number of moves to look ahead
+    _width: the number of boards to search from after each move
+    """
+    _proceed: bool
+    _depth: int
+    _width: int
+
+    def __init__(self, player_id: int, goal: Goal, depth: int = 2,
+                 width: int = 8) -> None:
+        """Initialize this BeamSearchPlayer with the given <player_id> and
+        <goal>, to look <depth> moves ahead with <width> boards per move.
+
+        Precondition: depth >= 1 and width >= 1
+        """
+        Player.__init__(self, player_id, goal)
+        self._depth = depth
+        self._width = width
+        self._proceed = False
+
+    def get_selected_block(self, board: Block) -> Optional[Block]:
+        return None
+
+    def process_event(self, event: pygame.event.Event) -> None:
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self._proceed = True
+
+    def generate_move(self, board: Block) ->\
+            Optional[Tuple[str, Optional[int], Block]]:
+        """Return the first move of the best line of moves found from
+        <board>, or PASS if none is worth more than the score of <board>.
+
+        Ties go to the line found first.
+
+        This function does not mutate <board>.
+        """
+        if not self._proceed:
+            return None  # Do not remove
+
+        score = self.goal.score(board)
+        best_move = _create_move(PASS, board)
+        best_value = score
+        # the most each board seen this turn has been worth, by board_hash
+        table = {board.board_hash(): score}
+        # each board to search from, with the penalties of the line of moves
+        # to it and the first move of that line
+        beam = [(board, 0, None)]
+        for ply in range(self._depth):
+            candidates = []
+            for parent, penalty, first in beam:
+                candidates.extend(self._candidates(parent, penalty, first))
+            # sorted is stable, so ties stay in the order they were found
+            candidates.sort(key=lambda candidate: -candidate[0])
+            if candidates and candidates[0][0] > best_value:
+                best_value = candidates[0][0]
+                best_move = candidates[0][2]
+            if ply < self._depth - 1:
+                beam = self._next_beam(candidates, table)
+
+        self._proceed = False  # Must set to False before returning!
+        return best_move
+
+    def _candidates(self, board: Block, penalty: int,
+                    first: Optional[Tuple[str, Optional[int], Block]]) -> \
+            List[Tuple[int, int, Tuple[str, Optional[int], Block],
+                       Tuple[str, Optional[int], Block], Block]]:
+        """Return (value, penalty, first move, move, board) for each legal
+        move on <board>, which was reached by a line of moves with <penalty>
+        that starts with <first>, or by no moves if <first> is None.
+
+        The board returned is the board after the move for a smash, whose
+        value cannot be worked out without making it, and <board> for the
+        other moves.
+        """
+        candidates = []
+        score = self.goal.score(board)
+        for move in legal_moves(board, self.goal.colour):
+            action, direction, block = move
+            new_penalty = penalty + ACTION_PENALTY[(action, direction)]
+            if action == SMASH[0]:
+                after, block_copy = board.path_copy(block)
+                block_copy.smash()
+                new_score = self.goal.score(after)
+            else:
+                after = board
+                new_score = score + self.goal.score_delta(board, move,
+                                                          score)
+            candidates.append((new_score - new_penalty, new_penalty,
+                               move if first is None else first, move,
+                               after))
+        return candidates
+
+    def _next_beam(self, candidates: List[
+            Tuple[int, int, Tuple[str, Optional[int], Block],
+                  Tuple[str, Optional[int], Block], Block]],
+                   table: Dict[int, int]) -> \
+            List[Tuple[Block, int, Tuple[str, Optional[int], Block]]]:
+        """Return the boards reached by the best of <candidates>, as made by
+        _candidates and sorted by value, skipping any board that <table> has
+        seen worth as much, until there are self._width of them.
+
+        Each board is returned with the penalty of the line to it and that
+        line's first move, and its value is recorded in <table>.
+        """
+        beam = []
+        for value, penalty, first, move, board in candidates:
+            if len(beam) == self._width:
+                break
+            action, direction, block = move
+            if action != SMASH[0]:
+                board, block_copy = board.path_copy(block)
+                MoveJournal(board).apply((action, direction, block_copy),
+                                         self.goal.colour)
+            key = board.board_hash()
+            if key not in table or table[key] < value:
+                table[key] = value
+                beam.append((board, penalty, first))
+        return beam
+
+
+def _best_random_move(linear: LinearBoard, goal_type: Type[Goal],
+                      colour: Tuple[int, int, int], count: int, seed: int) \
+        -> Tuple[str, Optional[int], Tuple[int, int], int, int]:
+    """Return the best of <count> random moves on <linear>, as a SmartPlayer
+    with a <goal_type> goal for <colour> would find them after seeding random
+    with <seed>.
+
+    The move is returned as (action, direction, position, level, score), where
+    position and level locate its block, and score is the score of the board
+    after the move. This is run in the processes of a SmartPlayer with more
+    than one worker.
+    """
+    random.seed(seed)
+    board = linear.to_block()
+    player = SmartPlayer(0, goal_type(colour), count)
+    score = player.goal.score(board)
+    best = (PASS[0], PASS[1], board.position, board.level, score)
+    for _ in range(count):
+        action, direction, block, new_score = \
+            player._generate_random_move(board, score)
+        if new_score > best[4]:
+            best = (action, direction, block.position, block.level, new_score)
+    return best
 
-        return new_action, new_direction,\
-               rand_block, self.goal.score(board_copy)
 
 if __name__ == '__main__':
     import python_ta
@@ -509,7 +1008,8 @@ if __name__ == '__main__':
         'allowed-io': ['process_event'],
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'actions', 'block',
-            'goal', 'pygame', '__future__'
+            'goal', 'moves', 'quadtree', 'concurrent.futures', 'math', 'time',
+            'pygame', '__future__'
         ],
         'max-attributes': 10,
         'generated-members': 'pygame.*'
@@ -0,0 +1,400 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin
+
+=== Module Description ===
+
+This file contains the LinearBoard class, an alternative to a tree of Block
+objects that stores a Blocky board as flat arrays.
+"""
+from __future__ import annotations
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+import random
+import math
+
+from block import Block, palette, palette_colour, palette_index
+from settings import COLOUR_LIST
+
+# the array typecode of palette indices, wide enough for any palette that
+# fits in memory
+_COLOUR_TYPECODE = 'I'
+
+
+def _interleave(x: int, y: int) -> int:
+    """Return the Morton code of the unit cell at column <x> and row <y>.
+
+    Bit i of <x> becomes bit 2i of the code and bit i of <y> becomes bit
+    2i + 1, so sorting cells by code visits the upper-left, upper-right,
+    lower-left and lower-right quadrant of every block in that order.
+
+    >>> _interleave(0, 0), _interleave(1, 0), _interleave(0, 1), \
+_interleave(3, 3)
+    (0, 1, 2, 15)
+    """
+    code = 0
+    bit = 0
+    while x or y:
+        code |= (x & 1) << (2 * bit) | (y & 1) << (2 * bit + 1)
+        x >>= 1
+        y >>= 1
+        bit += 1
+    return code
+
+
+def _deinterleave(code: int) -> Tuple[int, int]:
+    """Return the (column, row) of the unit cell with Morton code <code>.
+
+    >>> _deinterleave(_interleave(5, 9))
+    (5, 9)
+    """
+    x = 0
+    y = 0
+    bit = 0
+    while code:
+        x |= (code & 1) << bit
+        y |= (code >> 1 & 1) << bit
+        code >>= 2
+        bit += 1
+    return x, y
+
+
+class LinearBoard:
+    """A Blocky board stored as a linear quadtree.
+
+    Only the leaves of the tree are stored. Each leaf is described by the
+    Morton code of its upper-left unit cell, its level and the palette index
+    of its colour, in three parallel arrays sorted by Morton code. The leaves
+    of any block are therefore a contiguous run of the arrays.
+
+    A block is addressed by the column and row of its upper-left unit cell
+    and its level, where a unit cell is a block at <max_depth>. Every method
+    that changes the board has the same meaning as the Block method with the
+    same name, and returns False when the Block method would.
+
+    === Public Attributes ===
+    size:
+        The height and width of the board, in pixels.
+    max_depth:
+        The deepest level allowed in the board.
+
+    === Representation Invariants ===
+    - len(_codes) == len(_levels) == len(_colours) >= 1
+    - _codes is sorted in strictly increasing order
+    - the leaves cover every unit cell of the board exactly once
+    """
+    # === Private Attributes ===
+    # _codes:
+    #     The Morton code of the upper-left unit cell of each leaf.
+    # _levels:
+    #     The level of each leaf.
+    # _colours:
+    #     The palette index of the colour of each leaf.
+    size: int
+    max_depth: int
+    _codes: array
+    _levels: array
+    _colours: array
+
+    def __init__(self, size: int, colour: Tuple[int, int, int],
+                 max_depth: int) -> None:
+        """Initialize this board as a single undivided block of <colour>, with
+        dimensions <size> by <size>.
+        """
+        self.size = size
+        self.max_depth = max_depth
+        self._codes = array('Q', [0])
+        self._levels = array('B', [0])
+        self._colours = array(_COLOUR_TYPECODE, [palette_index(colour)])
+
+    @classmethod
+    def from_block(cls, board: Block) -> LinearBoard:
+        """Return a LinearBoard equivalent to the tree rooted at <board>.
+
+        Precondition: <board> is at level 0.
+        """
+        codes = []
+        levels = []
+        colours = []
+        stack = [(board, 0, 0)]
+        while stack:
+            block, x, y = stack.pop()
+            if block.children:
+                half = 1 << (board.max_depth - block.level - 1)
+                # pushed in reverse Z-order so that they are popped in Z-order
+                stack.append((block.children[3], x + half, y + half))
+                stack.append((block.children[2], x, y + half))
+                stack.append((block.children[0], x + half, y))
+                stack.append((block.children[1], x, y))
+            else:
+                codes.append(_interleave(x, y))
+                levels.append(block.level)
+                colours.append(palette_index(block.colour))
+
+        linear = cls.__new__(cls)
+        linear.size = board.size
+        linear.max_depth = board.max_depth
+        linear._codes = array('Q', codes)
+        linear._levels = array('B', levels)
+        linear._colours = array(_COLOUR_TYPECODE, colours)
+        return linear
+
+    def to_block(self) -> Block:
+        """Return a tree of Blocks equivalent to this board.
+        """
+        return Block.from_leaves(self.size, self.max_depth,
+                                 zip(self._levels, self._colours))
+
+    def __getstate__(self) -> Dict[str, object]:
+        """Return the state of this board to pickle.
+
+        Palette indices only mean something in the process that made them,
+        so the palette is pickled too.
+        """
+        return {'size': self.size, 'max_depth': self.max_depth,
+                'codes': self._codes, 'levels': self._levels,
+                'colours': self._colours, 'palette': palette()}
+
+    def __setstate__(self, state: Dict[str, object]) -> None:
+        """Restore this board from <state>, as returned by __getstate__ in
+        any process, translating its colours into this process's palette.
+        """
+        indices = [palette_index(colour) for colour in state['palette']]
+        self.size = state['size']
+        self.max_depth = state['max_depth']
+        self._codes = state['codes']
+        self._levels = state['levels']
+        self._colours = array(_COLOUR_TYPECODE,
+                              [indices[i] for i in state['colours']])
+
+    def create_copy(self) -> LinearBoard:
+        """Return a copy of this board that shares no arrays with it.
+        """
+        copy = LinearBoard.__new__(LinearBoard)
+        copy.size = self.size
+        copy.max_depth = self.max_depth
+        copy._codes = self._codes[:]
+        copy._levels = self._levels[:]
+        copy._colours = self._colours[:]
+        return copy
+
+    def __eq__(self, other: LinearBoard) -> bool:
+        """Return True iff this board and <other> have the same leaves.
+        """
+        return self.size == other.size and \
+            self.max_depth == other.max_depth and \
+            self._codes == other._codes and \
+            self._levels == other._levels and \
+            self._colours == other._colours
+
+    def __len__(self) -> int:
+        """Return the number of leaves on this board.
+        """
+        return len(self._codes)
+
+    def leaves(self) -> List[Tuple[int, int, int, Tuple[int, int, int]]]:
+        """Return a (column, row, level, colour) tuple for each leaf of this
+        board, in Z-order.
+        """
+        result = []
+        for code, level, colour in zip(self._codes, self._levels,
+                                       self._colours):
+            x, y = _deinterleave(code)
+            result.append((x, y, level, palette_colour(colour)))
+        return result
+
+    def _span(self, x: int, y: int, level: int) -> Tuple[int, int]:
+        """Return the range of Morton codes covered by the block at <level>
+        whose upper-left unit cell is at column <x> and row <y>.
+        """
+        start = _interleave(x, y)
+        return start, start + (1 << 2 * (self.max_depth - level))
+
+    def _leaf_index(self, x: int, y: int, level: int) -> Optional[int]:
+        """Return the index of the leaf at <level> whose upper-left unit cell
+        is at column <x> and row <y>, or None if there is no such leaf.
+        """
+        code = _interleave(x, y)
+        i = bisect_right(self._codes, code) - 1
+        if self._codes[i] == code and self._levels[i] == level:
+            return i
+        return None
+
+    def _subdivided(self, x: int, y: int, level: int) -> Tuple[int, int]:
+        """Return the range of leaf indices inside the block at <level> whose
+        upper-left unit cell is at column <x> and row <y>.
+
+        Return an empty range if there is no such block or it is a leaf.
+        """
+        start, stop = self._span(x, y, level)
+        lo = bisect_left(self._codes, start)
+        if lo == len(self._codes) or self._codes[lo] != start or \
+                self._levels[lo] <= level:
+            return lo, lo
+        return lo, bisect_left(self._codes, stop, lo)
+
+    def _replace(self, lo: int, hi: int,
+                 leaves: List[Tuple[int, int, int]]) -> None:
+        """Replace the leaves at indices <lo> to <hi> with <leaves>, a list of
+        (code, level, colour) tuples that covers the same cells.
+        """
+        leaves.sort()
+        self._codes[lo:hi] = array('Q', [leaf[0] for leaf in leaves])
+        self._levels[lo:hi] = array('B', [leaf[1] for leaf in leaves])
+        self._colours[lo:hi] = array(_COLOUR_TYPECODE,
+                                     [leaf[2] for leaf in leaves])
+
+    def smashable(self, x: int, y: int, level: int) -> bool:
+        """Return True iff the block at <level> whose upper-left unit cell is
+        at column <x> and row <y> can be smashed.
+        """
+        return level != self.max_depth and \
+            self._leaf_index(x, y, level) is not None
+
+    def smash(self, x: int, y: int, level: int) -> bool:
+        """Sub-divide the block at <level> whose upper-left unit cell is at
+        column <x> and row <y> into four randomly generated children.
+
+        Random numbers are drawn in the same order as Block.smash, so both
+        produce the same board from the same random state.
+
+        Return True iff the smash was performed.
+        """
+        if not self.smashable(x, y, level):
+            return False
+        i = self._leaf_index(x, y, level)
+        leaves = []
+        self._smash_leaves(x, y, level, leaves)
+        self._replace(i, i + 1, leaves)
+        return True
+
+    def _smash_leaves(self, x: int, y: int, level: int,
+                      leaves: List[Tuple[int, int, int]]) -> None:
+        """Append to <leaves> the (code, level, colour) tuples of four randomly
+        generated children of the block at <level> whose upper-left unit cell
+        is at column <x> and row <y>, smashing them recursively in the same
+        way as Block.smash.
+        """
+        half = 1 << (self.max_depth - level - 1)
+        # upper-right, upper-left, lower-left, lower-right like Block.children
+        corners = [(x + half, y), (x, y), (x, y + half), (x + half, y + half)]
+        colours = [random.randrange(len(COLOUR_LIST)) for _ in corners]
+        if random.random() <= math.exp(-0.25 * level) and \
+                level + 1 != self.max_depth:
+            for corner in corners:
+                self._smash_leaves(corner[0], corner[1], level + 1, leaves)
+        else:
+            for corner, colour in zip(corners, colours):
+                leaves.append((_interleave(*corner), level + 1, colour))
+
+    def swap(self, x: int, y: int, level: int, direction: int) -> bool:
+        """Swap the children of the block at <level> whose upper-left unit cell
+        is at column <x> and row <y>. If <direction> is 1, swap vertically. If
+        <direction> is 0, swap horizontally.
+
+        Return True iff the swap was performed.
+
+        Precondition: <direction> is either 0 or 1
+        """
+        lo, hi = self._subdivided(x, y, level)
+        if lo == hi:
+            return False
+        # flip the column bit (0) or the row bit (1) of the children's digit
+        flip = 1 << (2 * (self.max_depth - level - 1) + direction)
+        self._replace(lo, hi, [(self._codes[i] ^ flip, self._levels[i],
+                                self._colours[i]) for i in range(lo, hi)])
+        return True
+
+    def rotate(self, x: int, y: int, level: int, direction: int) -> bool:
+        """Rotate the block at <level> whose upper-left unit cell is at column
+        <x> and row <y>, and all its descendants. If <direction> is 1, rotate
+        clockwise. If <direction> is 3, rotate counter-clockwise.
+
+        Return True iff the rotate was performed.
+
+        Precondition: <direction> is either 1 or 3.
+        """
+        lo, hi = self._subdivided(x, y, level)
+        if lo == hi:
+            return False
+        cells = 1 << (self.max_depth - level)
+        leaves = []
+        for i in range(lo, hi):
+            leaf_x, leaf_y = _deinterleave(self._codes[i])
+            dx = leaf_x - x
+            dy = leaf_y - y
+            leaf_cells = 1 << (self.max_depth - self._levels[i])
+            if direction == 1:
+                dx, dy = cells - dy - leaf_cells, dx
+            else:
+                dx, dy = dy, cells - dx - leaf_cells
+            leaves.append((_interleave(x + dx, y + dy), self._levels[i],
+                           self._colours[i]))
+        self._replace(lo, hi, leaves)
+        return True
+
+    def paint(self, x: int, y: int, level: int,
+              colour: Tuple[int, int, int]) -> bool:
+        """Change the colour of the block at <level> whose upper-left unit cell
+        is at column <x> and row <y> iff it is a leaf at <max_depth> and its
+        colour is different from <colour>.
+
+        Return True iff the colour was changed.
+        """
+        if level != self.max_depth:
+            return False
+        i = self._leaf_index(x, y, level)
+        index = palette_index(colour)
+        if i is None or self._colours[i] == index:
+            return False
+        self._colours[i] = index
+        return True
+
+    def combine(self, x: int, y: int, level: int) -> bool:
+        """Turn the block at <level> whose upper-left unit cell is at column
+        <x> and row <y> into a leaf of the majority colour of its children.
+
+        Return True iff the block was turned into a leaf.
+        """
+        if level != self.max_depth - 1:
+            return False
+        lo, hi = self._subdivided(x, y, level)
+        if hi - lo != 4:
+            return False
+        counts = {}
+        for i in range(lo, hi):
+            counts[self._colours[i]] = counts.get(self._colours[i], 0) + 1
+        colour, count = max(counts.items(), key=lambda item: item[1])
+        if list(counts.values()).count(count) > 1:
+            # a tie does not constitute a majority
+            return False
+        self._replace(lo, hi, [(self._codes[lo], level, colour)])
+        return True
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'random', 'typing', '__future__', 'math',
+            'array', 'bisect', 'block', 'settings'
+        ],
+        'max-attributes': 15,
+        'max-args': 6
+    })
@@ -1,16 +1,22 @@
 from typing import List, Optional, Tuple
 import os
+import pickle
+import random
 import pygame
 import pytest
 
-from block import Block
-from blocky import _block_to_squares
-from goal import BlobGoal, PerimeterGoal, _flatten
-from player import _get_block, Player, SmartPlayer, RandomPlayer, _create_move
+from block import Block, MoveJournal, generate_board, generate_boards
+from benchmark import BOARD_KINDS, SCORERS, make_board, run_benchmarks
+from blocky import GameData, GameOverState, _block_to_squares
+from goal import BlobGoal, PerimeterGoal, _flatten, score_all
+from moves import legal_moves
+from quadtree import LinearBoard
+from player import _best_random_move, _get_block, _get_blocks, Player, \
+    SmartPlayer, RandomPlayer, MCTSPlayer, BeamSearchPlayer, _create_move
 from renderer import Renderer
 from settings import COLOUR_LIST
 from actions import KEY_ACTION, ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
-    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE, ACTION_PENALTY
 
 
 def set_children(block: Block, colours: List[Optional[Tuple[int, int, int]]]) \
@@ -32,6 +38,26 @@ def set_children(block: Block, colours: List[Optional[Tuple[int, int, int]]]) \
         block.children.append(b)
 
 
+def nested_board(max_depth: int,
+                 colour: Tuple[int, int, int] = COLOUR_LIST[1],
+                 size: int = 400) -> Block:
+    """Return a board with <max_depth> and <size> whose lower-right block is
+    split at every level. At each level, the other children are
+    COLOUR_LIST[0], COLOUR_LIST[1] and COLOUR_LIST[2], except that the
+    deepest upper-left child is <colour> and the deepest lower-right child is
+    COLOUR_LIST[3].
+    """
+    board = Block((0, 0), size, None, 0, max_depth)
+    block = board
+    for _ in range(max_depth - 1):
+        set_children(block, [COLOUR_LIST[0], COLOUR_LIST[1], COLOUR_LIST[2],
+                             None])
+        block = block.children[3]
+    set_children(block, [COLOUR_LIST[0], colour, COLOUR_LIST[2],
+                         COLOUR_LIST[3]])
+    return board
+
+
 def test_smash_on_entire_board() -> None:
     board1 = Block((0, 0), 400, COLOUR_LIST[0], 0, 0)
     assert not board1.smash()
@@ -223,5 +249,636 @@ def test_get_block_7() -> None:
     assert actual3 is None
 
 
+def test_block_has_no_instance_dict() -> None:
+    board = Block((0, 0), 400, COLOUR_LIST[0], 0, 2)
+    board.smash()
+    assert not hasattr(board, '__dict__')
+    assert not hasattr(board.children[0], '__dict__')
+
+
+def test_block_colour_round_trip() -> None:
+    b = Block((0, 0), 400, (10, 20, 30), 0, 1)
+    assert b.colour == (10, 20, 30)
+    b.colour = COLOUR_LIST[3]
+    assert b.colour == COLOUR_LIST[3]
+    assert b.paint(COLOUR_LIST[1]) is False
+    b.colour = None
+    assert b.colour is None
+
+
+def test_smashed_children_share_max_depth() -> None:
+    board = Block((0, 0), 400, COLOUR_LIST[0], 0, 3)
+    board.smash()
+    for child in board.children:
+        assert child.max_depth == 3
+        assert child.level == 1
+        assert child.size == 200
+
+
+def test_create_copy_is_deep() -> None:
+    board = Block((0, 0), 400, None, 0, 1)
+    set_children(board, [COLOUR_LIST[0], COLOUR_LIST[1], COLOUR_LIST[2],
+                         COLOUR_LIST[3]])
+    copy = board.create_copy()
+    assert copy == board
+    assert copy.children[0] is not board.children[0]
+    assert copy.children[0].paint(COLOUR_LIST[1])
+    assert copy != board
+    assert board.children[0].colour == COLOUR_LIST[0]
+
+
+def test_linear_board_round_trip() -> None:
+    board = nested_board(2)
+    linear = LinearBoard.from_block(board)
+    assert len(linear) == 7
+    assert linear.to_block() == board
+
+
+def test_linear_board_matches_block_moves() -> None:
+    board = nested_board(2, COLOUR_LIST[0])
+    linear = LinearBoard.from_block(board)
+
+    assert linear.rotate(0, 0, 0, 1) == board.rotate(1)
+    assert linear.to_block() == board
+    # the subdivided child is now the lower-left one
+    assert linear.swap(0, 2, 1, 1) == board.children[2].swap(1)
+    assert linear.to_block() == board
+    assert linear.paint(0, 2, 2, COLOUR_LIST[1]) == \
+        board.children[2].children[1].paint(COLOUR_LIST[1])
+    assert linear.to_block() == board
+    assert linear.combine(0, 2, 1) == board.children[2].combine()
+    assert linear.to_block() == board
+    assert linear.swap(0, 0, 0, 0) == board.swap(0)
+    assert linear.to_block() == board
+    assert not linear.swap(0, 2, 1, 1)
+    assert not linear.paint(0, 0, 1, COLOUR_LIST[3])
+
+
+def test_linear_board_copy_is_independent() -> None:
+    linear = LinearBoard(400, COLOUR_LIST[0], 1)
+    assert linear.smash(0, 0, 0)
+    copy = linear.create_copy()
+    assert copy == linear
+    assert copy.paint(0, 0, 1, (1, 2, 3))
+    assert copy != linear
+
+
+def test_linear_board_holds_any_palette_index() -> None:
+    linear = LinearBoard(400, COLOUR_LIST[0], 1)
+    assert linear.smash(0, 0, 0)
+    # more colours than fit in a byte
+    colours = [(i // 256, i % 256, 7) for i in range(300)]
+    for colour in colours:
+        assert linear.paint(0, 0, 1, colour)
+    assert linear.leaves()[0][3] == colours[-1]
+    board = linear.to_block()
+    assert LinearBoard.from_block(board) == linear
+
+
+def test_path_copy_shares_untouched_blocks() -> None:
+    board = nested_board(2)
+    target = board.children[3].children[1]
+    copy, target_copy = board.path_copy(target)
+    assert copy == board
+    assert copy is not board and target_copy is not target
+    assert copy.children[0] is board.children[0]
+    assert copy.children[3] is not board.children[3]
+    assert copy.children[3].children[0] is board.children[3].children[0]
+
+
+def test_path_copy_moves_leave_original_unchanged() -> None:
+    board = nested_board(3)
+    original = board.create_copy()
+
+    expected = board.create_copy()
+    expected.rotate(1)
+    copy, root_copy = board.path_copy(board)
+    assert root_copy is copy
+    assert copy.rotate(1)
+    assert copy == expected
+    assert board == original
+
+    expected = board.create_copy()
+    expected.children[3].swap(0)
+    copy, block_copy = board.path_copy(board.children[3])
+    assert block_copy.swap(0)
+    assert copy == expected
+    assert board == original
+
+    leaf = board.children[3].children[3].children[2]
+    copy, leaf_copy = board.path_copy(leaf)
+    assert leaf_copy.paint(COLOUR_LIST[0])
+    assert copy != board
+    assert board == original
+
+
+def test_swap_updates_positions_lazily() -> None:
+    board = nested_board(2)
+    moved = board.children[3]
+    grandchild = moved.children[1]
+    assert board.swap(0)
+    # nothing below the swapped block has been touched yet
+    assert moved.position == (200, 200)
+    assert grandchild.position == (200, 200)
+    assert board.children[2] is moved
+    assert moved.position == (0, 200)
+    assert grandchild.position == (200, 200)
+    assert moved.children[1] is grandchild
+    assert grandchild.position == (0, 200)
+
+
+def test_rotate_positions_match_children_order() -> None:
+    board = nested_board(3)
+    assert board.rotate(3)
+    assert board.children[0].rotate(1)
+    for block in [board, board.children[0], board.children[0].children[3]]:
+        size = block._child_size()
+        x, y = block.position
+        assert [child.position for child in block.children] == \
+            [(x + size, y), (x, y), (x, y + size), (x + size, y + size)]
+    leaf = board.children[0].children[3].children[1]
+    assert leaf.position == (300, 100)
+    assert _get_block(board, (300, 100), 3) is leaf
+
+
+def test_rotate_is_applied_when_read() -> None:
+    board = nested_board(2)
+    inner = board.children[3]
+    assert board.rotate(1)
+    assert board.rotate(1)
+    assert board.rotate(1)
+    # three clockwise turns are pending on the board, none on its children
+    assert board._turns == 3
+    assert inner._turns == 0
+    assert board.children[0] is inner
+    assert inner._turns == 3
+    assert [child.colour for child in inner.children] == \
+        [COLOUR_LIST[3], COLOUR_LIST[0], COLOUR_LIST[1], COLOUR_LIST[2]]
+
+    expected = Block((0, 0), 400, None, 0, 2)
+    set_children(expected, [None, COLOUR_LIST[0], COLOUR_LIST[1],
+                            COLOUR_LIST[2]])
+    set_children(expected.children[0],
+                 [COLOUR_LIST[3], COLOUR_LIST[0], COLOUR_LIST[1],
+                  COLOUR_LIST[2]])
+    assert board == expected
+
+
+def test_journal_undoes_moves_in_reverse() -> None:
+    board = nested_board(2, COLOUR_LIST[0])
+    original = board.create_copy()
+    journal = MoveJournal(board)
+
+    assert journal.apply(_create_move(ROTATE_CLOCKWISE, board))
+    # the subdivided child is now the lower-left one
+    inner = board.children[2]
+    assert journal.apply(_create_move(SWAP_VERTICAL, inner))
+    assert not journal.apply(_create_move(PAINT, inner.children[1]))
+    assert inner.children[1].colour is not None
+    assert journal.apply(_create_move(PAINT, inner.children[1]),
+                         COLOUR_LIST[0])
+    assert journal.apply(_create_move(COMBINE, inner))
+    assert journal.apply(_create_move(SMASH, board.children[0]))
+    assert not journal.apply(_create_move(SMASH, board))
+    assert len(journal) == 5
+
+    journal.undo()
+    assert not board.children[0].children
+    journal.undo()
+    assert inner.children
+    journal.undo_all()
+    assert len(journal) == 0
+    assert board == original
+
+
+def test_board_hash_follows_moves() -> None:
+    board = nested_board(2, COLOUR_LIST[0])
+    original = board.board_hash()
+
+    assert board.rotate(1)
+    assert board.children[2].swap(0)
+    assert board.children[2].children[1].paint(COLOUR_LIST[3])
+    rotated = board.board_hash()
+    assert rotated != original
+    # recomputing from scratch gives the hash kept up to date by the moves
+    assert board.create_copy().board_hash() == rotated
+    copy = Block((0, 0), 400, None, 0, 2)
+    copy.children = [child.create_copy() for child in board.children]
+    assert copy.board_hash() == rotated
+
+
+def test_board_hash_of_trial_copy() -> None:
+    random.seed(3)
+    board = generate_board(3, 750)
+    original = board.board_hash()
+    copy, block = board.path_copy(board.children[2])
+    # trial moves on the copy do not pay to keep its hash up to date
+    assert block.rotate(1)
+    assert not copy.keeps_hash()
+    assert block.rotate(3)
+    assert copy.board_hash() == original
+    assert block.rotate(3)
+    assert copy.board_hash() == copy.create_copy().board_hash()
+    assert copy.board_hash() != original
+    assert board.board_hash() == original
+
+
+def _drawn_from_scratch(board: Block) -> List[List[Tuple[int, int, int]]]:
+    """Return the grid of <board> drawn from scratch rather than kept up to
+    date by moves."""
+    fresh = Block(board.position, board.size, None, 0, board.max_depth)
+    fresh.children = [child.create_copy() for child in board.children]
+    return fresh.cell_grid()
+
+
+def test_cell_grid_follows_moves() -> None:
+    random.seed(5)
+    board = generate_board(3, 750)
+    grid = board.cell_grid()
+    assert _flatten(board) == grid == _drawn_from_scratch(board)
+    copy, block = board.path_copy(board.children[1])
+    assert block.rotate(1)
+    assert copy.cell_grid() == _drawn_from_scratch(copy)
+    assert copy.cell_grid() != grid
+    # the original's columns are not changed by moves on the copy
+    assert board.cell_grid() == _drawn_from_scratch(board)
+    assert board.swap(0)
+    assert board.cell_grid() == _drawn_from_scratch(board)
+
+
+def test_changes_since_mark() -> None:
+    board = nested_board(2)
+    mark = board.change_mark()
+    # the board does not keep its hash yet
+    assert not board.keeps_hash()
+    assert board.changes_since(mark) is None
+    board.board_hash()
+    mark = board.change_mark()
+    assert board.changes_since(mark) == []
+    assert board.children[3].children[0].paint(COLOUR_LIST[2])
+    assert board.changes_since(mark) == [(3, 2, 1)]
+    board.children[1].colour = COLOUR_LIST[2]
+    assert board.changes_since(mark) is None
+
+
+def test_generate_boards_is_reproducible() -> None:
+    random.seed(1)
+    boards = generate_boards(4, 750, 20, 148)
+    random.seed(2)
+    again = generate_boards(4, 750, 3, 148)
+    assert boards[:3] == again
+    assert boards[0] != boards[1]
+    assert all(board.max_depth == 4 and board.size == 750 and board.children
+               for board in boards)
+    # boards are made of valid blocks, like those from generate_board
+    assert _block_to_squares(boards[0]) == \
+        _block_to_squares(boards[0].create_copy())
+
+
+def test_get_blocks_matches_child_geometry() -> None:
+    board = nested_board(2, size=750)
+    inner = board.children[3]
+    # the children of inner are 188 pixels wide, so the split is at 563
+    assert inner.children[2].position == (375, 563)
+    locations = [(562, 562), (563, 563), (749, 0), (750, 0), (-1, 10),
+                 (400, 749)]
+    assert _get_blocks(board, locations, 2) == [
+        inner.children[1], inner.children[3], board.children[0], None, None,
+        inner.children[2]]
+    assert _get_blocks(board, locations, 1)[:2] == [inner, inner]
+    assert [_get_block(board, location, 2) for location in locations] == \
+        _get_blocks(board, locations, 2)
+
+
+def test_perimeter_goal_matches_flattened_edges() -> None:
+    random.seed(12)
+    board = generate_board(4, 750)
+    assert board.rotate(1)
+    assert board.children[3].swap(0) or board.children[3].smash()
+    cells = _flatten(board)
+    for colour in COLOUR_LIST:
+        edges = cells[0] + cells[-1] + [column[0] for column in cells] + \
+            [column[-1] for column in cells]
+        assert PerimeterGoal(colour).score(board) == edges.count(colour)
+
+
+def test_blob_goal_methods_agree() -> None:
+    random.seed(13)
+    board = generate_board(4, 750)
+    assert board.children[1].rotate(3) or board.children[1].paint(
+        COLOUR_LIST[0])
+    for colour in COLOUR_LIST:
+        assert BlobGoal(colour).score(board) == \
+            BlobGoal(colour, 'union_find').score(board) == \
+            BlobGoal(colour, 'recursive').score(board)
+
+
+def test_blob_goal_deep_board_does_not_recurse() -> None:
+    board = Block((0, 0), 750, COLOUR_LIST[2], 0, 7)
+    assert BlobGoal(COLOUR_LIST[2]).score(board) == 4 ** 7
+    assert BlobGoal(COLOUR_LIST[0]).score(board) == 0
+
+
+def test_calculate_all_scores_matches_calculate_score() -> None:
+    random.seed(15)
+    board = generate_board(4, 750)
+    players = [RandomPlayer(0, PerimeterGoal(COLOUR_LIST[0])),
+               RandomPlayer(1, BlobGoal(COLOUR_LIST[1])),
+               RandomPlayer(2, BlobGoal(COLOUR_LIST[2], 'union_find')),
+               RandomPlayer(3, PerimeterGoal(COLOUR_LIST[3]))]
+    data = GameData(board, players)
+    data.smashes[1] = 2
+    data.paints[3] = 1
+    scores = data.calculate_all_scores()
+    assert scores == {player.id: data.calculate_score(player.id)
+                      for player in players}
+    assert scores[1][1] > 0 and scores[0][1] == 0
+    # the shared leaves are scored without using the goals' caches
+    goals = [PerimeterGoal(COLOUR_LIST[1], 8),
+             BlobGoal(COLOUR_LIST[1], 'recursive', 8)]
+    assert score_all(goals, board) == [goal.score(board) for goal in goals]
+    assert all(goal.cache_misses == 1 and goal.cache_hits == 0
+               for goal in goals)
+
+
+def test_goal_score_cache() -> None:
+    random.seed(16)
+    board = generate_board(3, 750)
+    goal = BlobGoal(COLOUR_LIST[0], cache_limit=2)
+    expected = BlobGoal(COLOUR_LIST[0]).score(board)
+    assert goal.score(board) == expected
+    assert goal.score(board.create_copy()) == expected
+    assert (goal.cache_hits, goal.cache_misses) == (1, 1)
+
+    copy, block = board.path_copy(board.children[0])
+    assert block.rotate(1)
+    goal.score(copy)
+    assert block.rotate(3)
+    # rotating back gives the first board again
+    assert goal.score(copy) == expected
+    assert (goal.cache_hits, goal.cache_misses) == (2, 2)
+
+    goal.score(generate_board(3, 750))
+    # the rotated board was the least recently used, so it was forgotten
+    assert block.rotate(1)
+    goal.score(copy)
+    assert (goal.cache_hits, goal.cache_misses) == (2, 4)
+    assert PerimeterGoal(COLOUR_LIST[0]).cache_limit == 0
+
+
+def test_incremental_blob_goal_follows_moves() -> None:
+    random.seed(17)
+    board = generate_board(4, 750)
+    goals = [BlobGoal(colour, 'incremental') for colour in COLOUR_LIST]
+    journal = MoveJournal(board)
+    moves = [(ROTATE_CLOCKWISE, None), (SWAP_VERTICAL, 0), (SMASH, 1),
+             (COMBINE, 2), (PAINT, 3)]
+    for action, child in moves:
+        block = board if child is None else board.children[child]
+        journal.apply(_create_move(action, block), COLOUR_LIST[1])
+        for goal in goals:
+            assert goal.score(board) == BlobGoal(goal.colour).score(board)
+    journal.undo_all()
+    for goal in goals:
+        assert goal.score(board) == BlobGoal(goal.colour).score(board)
+    # other boards are scored without disturbing the labels of the first
+    other = generate_board(3, 750)
+    assert goals[0].score(other) == BlobGoal(COLOUR_LIST[0]).score(other)
+
+
+def test_score_delta_matches_trial_move() -> None:
+    random.seed(18)
+    board = generate_board(3, 750)
+    before = _block_to_squares(board)
+    goals = [PerimeterGoal(COLOUR_LIST[0]), BlobGoal(COLOUR_LIST[1])]
+    for goal in goals:
+        for action in [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,
+                       SWAP_HORIZONTAL, SWAP_VERTICAL]:
+            block = board.children[0]
+            delta = goal.score_delta(board, _create_move(action, block))
+            copy, block_copy = board.path_copy(block)
+            if block_copy.children:
+                getattr(block_copy, action[0])(action[1])
+                assert delta == goal.score(copy) - goal.score(board)
+                assert goal.score_delta(board, _create_move(action, block),
+                                        goal.score(board)) == delta
+            else:
+                assert delta is None
+        assert goal.score_delta(board, _create_move(SMASH, board)) is None
+        assert goal.score_delta(board, _create_move(PASS, board)) == 0
+    assert goals[1].score_delta(board, _create_move(PAINT, board)) is None
+    assert _block_to_squares(board) == before
+
+
+def test_score_many_matches_score() -> None:
+    random.seed(19)
+    board = generate_board(3, 750)
+    boards = [board, generate_board(2, 750), board.children[1]]
+    for child in range(4):
+        for direction in (1, 3, 1):
+            copy, block = board.path_copy(board.children[child])
+            block.rotate(direction)
+            boards.append(copy)
+    for goal in [PerimeterGoal(COLOUR_LIST[2]), BlobGoal(COLOUR_LIST[3])]:
+        assert goal.score_many(boards) == [goal.score(b) for b in boards]
+    # boards that do not keep their hash are left that way
+    assert all(not copy.keeps_hash() for copy in boards[3:])
+
+    scored = []
+
+    class CountingGoal(PerimeterGoal):
+        def _score(self, board: Block) -> int:
+            scored.append(board)
+            return PerimeterGoal._score(self, board)
+
+    hashes = {copy.board_hash() for copy in boards[3:]}
+    CountingGoal(COLOUR_LIST[2]).score_many(boards[3:])
+    # each distinct board was scored once
+    assert len(scored) == len(hashes) < len(boards[3:])
+
+
+def test_benchmark_reports_every_case() -> None:
+    board = make_board('checkerboard', 3, 1)
+    cells = _flatten(board)
+    assert all(cells[i][j] == COLOUR_LIST[(i + j) % 2]
+               for i in range(8) for j in range(8))
+    assert BlobGoal(COLOUR_LIST[0]).score(board) == 1
+    assert board.keeps_hash()
+    board.forget_caches()
+    assert not board.keeps_hash()
+
+    assert 'BlobGoal.score[incremental]' in SCORERS
+    results = run_benchmarks([2, 3], BOARD_KINDS, list(SCORERS), 0.0, 1)
+    assert len(results) == 2 * len(BOARD_KINDS) * len(SCORERS)
+    for result in results:
+        assert result['ops_per_sec'] > 0
+        assert result['warm_ops_per_sec'] > 0
+        assert result['peak_memory_bytes'] >= 0
+        assert result['max_recursion_depth'] >= 1
+    # each cold call draws the grid again, so it needs more memory on a
+    # bigger board
+    peaks = [result['peak_memory_bytes'] for result in results
+             if result['function'] == 'goal._flatten' and
+             result['board'] == 'fully_smashed']
+    assert peaks[0] < peaks[1]
+
+
+def test_legal_moves_are_exactly_the_performable_ones() -> None:
+    board = nested_board(2, COLOUR_LIST[0])
+    before = _block_to_squares(board)
+    moves = legal_moves(board, COLOUR_LIST[0])
+    assert _block_to_squares(board) == before
+    inner = board.children[3]
+    assert moves[:4] == [(action[0], action[1], board) for action in
+                         [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,
+                          SWAP_HORIZONTAL, SWAP_VERTICAL]]
+    assert _create_move(SMASH, board.children[0]) in moves
+    assert _create_move(COMBINE, inner) in moves
+    assert _create_move(PAINT, inner.children[2]) in moves
+    assert _create_move(PAINT, inner.children[0]) not in moves
+    assert len(moves) == 4 + 3 + 4 + 1 + 2
+
+
+def test_exhaustive_smart_player_picks_best_move() -> None:
+    goal = PerimeterGoal(COLOUR_LIST[0])
+    for seed in range(10):
+        board = generate_boards(3, 400, 1, seed)[0]
+        before = _block_to_squares(board)
+        player = SmartPlayer(0, goal, 0, exhaustive=True)
+        player._proceed = True
+        move = player.generate_move(board)
+        assert _block_to_squares(board) == before
+        assert not player._proceed
+        deltas = [goal.score_delta(board, other) for other in
+                  legal_moves(board, goal.colour) if other[0] != SMASH[0]]
+        best = max([0] + [delta for delta in deltas if delta is not None])
+        if move[0] == PASS[0]:
+            assert best == 0
+        else:
+            assert goal.score_delta(board, move) == best > 0
+        player._proceed = True
+        assert player.generate_move(board) == move
+
+
+def test_parallel_smart_player_moves_on_the_board() -> None:
+    goal = PerimeterGoal(COLOUR_LIST[0])
+    board = generate_boards(3, 400, 1, 0)[0]
+    before = _block_to_squares(board)
+    player = SmartPlayer(0, goal, 10, workers=2)
+    try:
+        moves = []
+        for _ in range(2):
+            random.seed(148)
+            player._proceed = True
+            moves.append(player.generate_move(board))
+            assert not player._proceed
+    finally:
+        # the processes are stopped when the game ends
+        GameOverState(GameData(board, [player]))
+    assert player._pool is None
+    assert _block_to_squares(board) == before
+    assert moves[0] == moves[1]
+    action, direction, block = moves[0]
+    assert _get_block(board, block.position, block.level) is block
+    if action not in [PASS[0], SMASH[0]]:
+        assert goal.score_delta(board, moves[0]) > 0
+
+    # a process finds the same move as a sequential player seeded the same way
+    random.seed(7)
+    player = SmartPlayer(0, goal, 10)
+    player._proceed = True
+    action, direction, block = player.generate_move(board)
+    assert _best_random_move(LinearBoard.from_block(board), PerimeterGoal,
+                             goal.colour, 10, 7)[:4] == \
+        (action, direction, block.position, block.level)
+
+    # boards are sent with their palette, so they can be read in a process
+    # whose palette is in another order
+    linear = LinearBoard.from_block(board)
+    assert pickle.loads(pickle.dumps(linear)) == linear
+    state = linear.__getstate__()
+    last = len(state['palette']) - 1
+    state['palette'] = state['palette'][::-1]
+    state['colours'] = [last - colour for colour in state['colours']]
+    copy = LinearBoard.__new__(LinearBoard)
+    copy.__setstate__(state)
+    assert copy == linear
+
+
+def test_mcts_player() -> None:
+    goal = PerimeterGoal(COLOUR_LIST[0])
+    # painting a corner is the only kind of move that beats passing
+    board = Block((0, 0), 400, None, 0, 1)
+    set_children(board, [COLOUR_LIST[1]] * 4)
+    player = MCTSPlayer(0, goal, iterations=50)
+    player._proceed = True
+    move = player.generate_move(board)
+    assert move[0] == PAINT[0] and move[2] in board.children
+    assert not player._proceed
+    assert _block_to_squares(board) == [(COLOUR_LIST[1], position, 200) for
+                                        position in [(200, 0), (0, 0),
+                                                     (0, 200), (200, 200)]]
+
+    board = generate_boards(3, 400, 1, 0)[0]
+    before = _block_to_squares(board)
+    moves = []
+    for _ in range(2):
+        random.seed(148)
+        player._proceed = True
+        moves.append(player.generate_move(board))
+    assert _block_to_squares(board) == before
+    assert moves[0] == moves[1]
+    block = moves[0][2]
+    assert _get_block(board, block.position, block.level) is block
+
+    player = MCTSPlayer(0, goal, time_limit=0.0)
+    player._proceed = True
+    assert player.generate_move(board) is not None
+
+    with pytest.raises(ValueError):
+        MCTSPlayer(0, goal)
+
+
+def test_beam_search_player_finds_two_move_lines() -> None:
+    # smashes are searched with random results
+    random.seed(148)
+    goal = BlobGoal(COLOUR_LIST[1])
+    board = generate_boards(2, 400, 1, 4)[0]
+    before = _block_to_squares(board)
+    score = goal.score(board)
+    player = BeamSearchPlayer(0, goal, depth=1, width=50)
+    player._proceed = True
+    assert player.generate_move(board) == _create_move(PASS, board)
+
+    # no single move is worth its penalty, but a line of two moves is
+    player = BeamSearchPlayer(0, goal, depth=2, width=50)
+    player._proceed = True
+    action, direction, block = player.generate_move(board)
+    assert not player._proceed
+    assert _block_to_squares(board) == before
+    assert action not in [PASS[0], SMASH[0]]
+    after, block = board.path_copy(block)
+    assert MoveJournal(after).apply((action, direction, block), goal.colour)
+    penalty = ACTION_PENALTY[(action, direction)]
+    assert any(goal.score(after) + goal.score_delta(after, move) - penalty -
+               ACTION_PENALTY[move[:2]] > score
+               for move in legal_moves(after, goal.colour)
+               if move[0] != SMASH[0])
+
+
+def test_setting_colour_updates_hash_and_grid() -> None:
+    board = Block((0, 0), 400, None, 0, 1)
+    set_children(board, [COLOUR_LIST[0], COLOUR_LIST[0], COLOUR_LIST[1],
+                         COLOUR_LIST[1]])
+    old_hash = board.board_hash()
+    assert _flatten(board)[0][0] == COLOUR_LIST[0]
+    board.children[1].colour = COLOUR_LIST[2]
+    assert board.board_hash() != old_hash
+    assert board.cell_grid() == _drawn_from_scratch(board)
+    assert _flatten(board)[0][0] == COLOUR_LIST[2]
+    assert BlobGoal(COLOUR_LIST[0], 'union_find').score(board) == \
+        BlobGoal(COLOUR_LIST[0], 'leaves').score(board) == 1
+
+
 if __name__ == '__main__':
     pytest.main(['A2_tests.py'])